@@ -0,0 +1,28 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+_pending = {}
+
+
+def _freeze(value):
+    # Converts list-like arguments into hashable tuples so they can form part of a key
+    if isinstance(value, (list, tuple, np.ndarray, pd.Series)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+async def _run_coalesced(key, func, executor=None):
+    # Runs func in the executor, concurrent calls with an equal key share one computation
+    loop = asyncio.get_running_loop()
+    key = (loop, _freeze(key))
+    future = _pending.get(key)
+    if future is None:
+        future = loop.run_in_executor(executor, func)
+        _pending[key] = future
+        future.add_done_callback(lambda f: _pending.pop(key, None))
+    # Shielded so a cancelled caller does not cancel the computation shared with others
+    return await asyncio.shield(future)
@@ -0,0 +1,423 @@
+import arviz as az
+import numpy as np
+
+from bayespropestimation.bayesprophelpers import (
+    _COUNT_CHECKS,
+    _METRICS,
+    _calculate_metric,
+    _draws_dataset,
+    _export_draws,
+    _invalid_counts,
+    _is_seed,
+    _make_read_only,
+    _mean_mcse,
+    _probability_mcse,
+    _quantile_mcse,
+    _rope_decision,
+    _rope_probabilities,
+    _sorted_hdi,
+)
+from bayespropestimation.bayespropshared import SharedPosteriorHandle
+from bayespropestimation.bayespropsummary import PosteriorSummary
+
+
+def validate_counts(a, b, labels=None, as_frame=True):
+    """
+    Checks every experiment (row) of the counts at once, without raising, to find the rows that
+    BayesProportionsBatchEstimation cannot estimate
+    Parameters
+    ----------
+    a: list, ndarray or DataFrame [[successes, trials], ...]:  array describing results from sample a, one row per experiment
+    b: list, ndarray or DataFrame [[successes, trials], ...]:  array describing results from sample b, one row per experiment
+    labels: list, label for each experiment.  Default None (0, 1, 2, ...)
+    as_frame:  boolean, returns a pd.DataFrame if True, otherwise a lightweight PosteriorSummary.  Default True
+    Returns
+    -------
+    pd.DataFrame (or PosteriorSummary if as_frame is False), one row per experiment:
+        'missing':  True if a count of a or b is missing or not finite
+        'negative':  True if a count of a or b is < 0
+        'successes_exceed_trials':  True if the successes of a or b exceed the trials
+        'invalid':  True if any of the above is True
+        'experiment':  label of the experiment
+    """
+    a = np.asarray(a)
+    b = np.asarray(b)
+    if a.ndim != 2 or a.shape[1] != 2 or a.shape != b.shape:
+        raise ValueError("a and b must be arrays of the same shape [experiments, 2]")
+    masks = _invalid_counts(a, b)
+    summary = PosteriorSummary(
+        np.vstack([masks, masks.any(axis=0)]).T,
+        _COUNT_CHECKS + ["invalid"],
+        {"experiment": np.arange(0, a.shape[0]) if labels is None else labels},
+    )
+    if as_frame is True:
+        return summary.to_frame()
+    return summary
+
+
+class BayesProportionsBatchEstimation:
+    def __init__(
+        self,
+        a,
+        b,
+        prior_alpha=0.5,
+        prior_beta=0.5,
+        n=10000,
+        seed=None,
+        labels=None,
+        metrics=["difference"],
+        invalid="raise",
+    ):
+        """
+        Initialises the BayesProportionsBatchEstimation class and samples from the posterior distributions
+        of many independent experiments at once.  Equivalent to a BayesProportionsEstimation per experiment,
+        with draws held in arrays of shape [experiments, n] (memory grows as 3 x experiments x n floats).
+        Parameters
+        ----------
+        a: list, ndarray or DataFrame [[successes, trials], ...]:  array describing results from sample a, one row per experiment
+        b: list, ndarray or DataFrame [[successes, trials], ...]:  array describing results from sample b, one row per experiment
+        prior_alpha: float, alpha parameter for the Beta prior distribution, default = 0.5 (Jeffreys prior)
+        prior_beta: float, beta parameter for the Beta prior distribution, default = 0.5 (Jeffreys prior)
+        n: integer, number of samples to take from each posterior distribution, default = 10000
+        seed: integer, set random seed at the start of the initialisation, default = None
+        labels: list, label for each experiment.  Default None (0, 1, 2, ...)
+        metrics: list, metrics comparing b with a derived from the draws, see BayesProportionsEstimation.
+            Default ['difference']
+        invalid: str, handling of experiments with missing or negative counts, or successes exceeding trials
+            (see validate_counts).  'raise' raises a ValueError, 'skip' drops them (labels default to the
+            positions of the kept rows), 'flag' keeps them with NaN draws and summaries.  Default 'raise'
+        Attributes
+        ----------
+        invalid_rows: np.ndarray[bool], True for each row of the input that failed validation
+        """
+        self.a = np.asarray(a)
+        self.b = np.asarray(b)
+        self.prior_alpha = prior_alpha
+        self.prior_beta = prior_beta
+        self.n = n
+        self.seed = seed
+        self.labels = labels
+        self.metrics = metrics
+        self.invalid = invalid
+        self._check_inputs()
+        if self.labels is None:
+            self.labels = np.arange(0, self.a.shape[0])
+        self._valid = ~self.invalid_rows
+        if self.invalid == "skip":
+            self.a = self.a[self._valid]
+            self.b = self.b[self._valid]
+            self.labels = np.asarray(self.labels)[self._valid]
+            self._valid = self._valid[self._valid]
+        self._sample_posteriors()
+
+    def _check_inputs(self):
+        # Checks that parameters are in the correct format
+        if (
+            self.a.ndim != 2
+            or self.a.shape[1] != 2
+            or self.a.shape != self.b.shape
+            or self.a.shape[0] == 0
+        ):
+            raise ValueError(
+                "a and b must be arrays of the same shape [experiments, 2] with experiments > 0"
+            )
+        if self.invalid not in ["raise", "skip", "flag"]:
+            raise ValueError("invalid must be 'raise', 'skip' or 'flag'")
+        masks = _invalid_counts(self.a, self.b)
+        self.invalid_rows = masks.any(axis=0)
+        if self.invalid == "raise":
+            if masks[0].any():
+                raise ValueError("the counts of successes and trials must be finite")
+            if masks[1].any():
+                raise ValueError("the counts of successes and trials must be >= 0")
+            if masks[2].any():
+                raise ValueError(
+                    "the count of successes for a and/or b exceeds the number of trials"
+                )
+        if (self.prior_alpha <= 0) or (self.prior_beta <= 0):
+            raise ValueError("the prior_alpha and/or prior_beta parameters must be > 0")
+        if self.n <= 0:
+            raise ValueError("n must be a positive integer")
+        if not _is_seed(self.seed):
+            raise ValueError("seed must be a positive integer or None")
+        if self.labels is not None and len(self.labels) != self.a.shape[0]:
+            raise ValueError("labels must be a list with one label per experiment")
+        if self.metrics is None or any(i not in _METRICS for i in self.metrics):
+            raise ValueError("metrics must be a list containing " + str(list(_METRICS)))
+
+    def _prior(self, arm):
+        # Parameters of the Beta prior of sample a (arm 0) or b (arm 1)
+        return self.prior_alpha, self.prior_beta
+
+    def _posterior_parameters(self, d, arm):
+        # Defines the parameters of the Beta posterior of each experiment
+        alpha, beta = self._prior(arm)
+        return d[:, 0] + alpha, d[:, 1] - d[:, 0] + beta
+
+    def _posterior_function(self, d, arm):
+        # Defines the posterior, one row of draws per experiment, NaN for experiments flagged as invalid
+        if self._valid.all():
+            alpha, beta = self._posterior_parameters(d, arm)
+            return self._random_state.beta(
+                alpha[:, None], beta[:, None], (d.shape[0], self.n)
+            )
+        alpha, beta = self._posterior_parameters(d[self._valid], arm)
+        draws = np.full((d.shape[0], self.n), np.nan)
+        draws[self._valid] = self._random_state.beta(
+            alpha[:, None], beta[:, None], (alpha.shape[0], self.n)
+        )
+        return draws
+
+    def _sample_posteriors(self):
+        # Draws from posterior, using a random state owned by the instance rather than the global
+        # NumPy random state
+        self._random_state = np.random.RandomState(self.seed)
+        a_draw = self._posterior_function(self.a, 0)
+        b_draw = self._posterior_function(self.b, 1)
+        d_draw = b_draw - a_draw
+        self.a_draw = a_draw
+        self.b_draw = b_draw
+        self.d_draw = d_draw
+        self.metric_draws = {"difference": d_draw}
+        for i in self.metrics:
+            if i not in self.metric_draws:
+                self.metric_draws[i] = _calculate_metric(a_draw, b_draw, i)
+        _make_read_only(a_draw, b_draw, *self.metric_draws.values())
+
+    def _get_draws(self, metric):
+        # Retrieves the draws of a, b and of the metric comparing them
+        if metric not in self.metric_draws:
+            raise ValueError(
+                "metric must be one of the metrics set at initialisation "
+                + str(list(self.metric_draws))
+            )
+        return [self.a_draw, self.b_draw, self.metric_draws[metric]]
+
+    def get_posteriors(self, metric="difference"):
+        """
+        Retrieves random draws from the posteriors
+        Parameters
+        ----------
+        metric:  str, metric comparing b with a, one of the metrics set at initialisation.  Default 'difference'
+        Returns
+        -------
+        tuple:
+            - np.array[experiments, n] draws from the posterior of theta_a
+            - np.array[experiments, n] draws from the posterior of theta_b
+            - np.array[experiments, n] draws from the posterior of the metric, by default theta_b minus theta_a
+        """
+        return tuple(self._get_draws(metric))
+
+    def share_draws(self, path=None):
+        """
+        Copies the draws into shared memory, or into a memory-mapped file if path is given, so that worker
+        processes can compute summaries from them without a pickled copy of the draws each
+        Parameters
+        ----------
+        path: str, path of a memory-mapped file to hold the draws.  Default None (multiprocessing.shared_memory)
+        Returns
+        -------
+        SharedPosteriorHandle, see BayesProportionsEstimation.share_draws
+        """
+        return SharedPosteriorHandle(self, path)
+
+    def to_dataset(self, names=None, metrics=None):
+        """
+        Wraps the draws of every experiment in one xarray Dataset without copying them
+        Parameters
+        ----------
+        names: list, variable names in order: a, b, then one per metric.  Default ['theta_a', 'theta_b', 'delta', ...]
+        metrics: list, metrics comparing b with a to include, from the metrics set at initialisation.  Default None (all)
+        Returns
+        -------
+        xr.Dataset, one variable per parameter with dims (chain, draw, experiment), a single chain of n draws,
+            the labels and counts of each experiment as coordinates and the priors as attributes
+        """
+        draws, names = _export_draws(
+            self.a_draw, self.b_draw, self.metric_draws, names, metrics
+        )
+        experiments = {
+            "experiment": self.labels,
+            "a_successes": ("experiment", self.a[:, 0]),
+            "a_trials": ("experiment", self.a[:, 1]),
+            "b_successes": ("experiment", self.b[:, 0]),
+            "b_trials": ("experiment", self.b[:, 1]),
+        }
+        attrs = {"prior_alpha": self.prior_alpha, "prior_beta": self.prior_beta}
+        if self.seed is not None:
+            attrs["seed"] = self.seed
+        return _draws_dataset(draws, names, attrs, experiments)
+
+    def to_inference_data(self, names=None, metrics=None):
+        """
+        Wraps the draws of every experiment in an ArviZ InferenceData without copying them
+        Parameters
+        ----------
+        names: list, variable names in order: a, b, then one per metric.  Default ['theta_a', 'theta_b', 'delta', ...]
+        metrics: list, metrics comparing b with a to include, from the metrics set at initialisation.  Default None (all)
+        Returns
+        -------
+        az.InferenceData, with the posterior group returned by to_dataset
+        """
+        return az.InferenceData(posterior=self.to_dataset(names, metrics))
+
+    def _make_summary(self, q, col_names, names, as_frame):
+        # Arranges [experiments, 3, columns] summaries into one columnar summary
+        summary = PosteriorSummary(
+            q.reshape(-1, q.shape[2]),
+            col_names,
+            {
+                "experiment": np.repeat(self.labels, 3),
+                "parameter": np.tile(names, q.shape[0]),
+            },
+        )
+        if as_frame is True:
+            return summary.to_frame()
+        return summary
+
+    def quantile_summary(
+        self,
+        mean=True,
+        quantiles=[0.025, 0.5, 0.975],
+        names=None,
+        as_frame=True,
+        metric="difference",
+        mcse=False,
+    ):
+        """
+        Summarises the properties of the estimated posteriors of every experiment using quantiles
+        Parameters
+        ----------
+        mean:  boolean, calculates the mean of the draws from the posterior.  Default True
+        quantiles: list, calculates the quantiles of the draws from the posterior.  Default [0.025, 0.5, 0.975]
+        names:  list of length 3, parameter names in order: a, b, b-a.  Default ['theta_a', 'theta_b', 'delta']
+        as_frame:  boolean, returns a pd.DataFrame if True, otherwise a lightweight PosteriorSummary.  Default True
+        metric:  str, metric comparing b with a, one of the metrics set at initialisation.  Default 'difference'
+        mcse:  boolean, adds the Monte Carlo standard error of each quantile and of the mean, in columns
+            suffixed '_mcse', see BayesProportionsEstimation.quantile_summary.  Default False
+        Returns
+        -------
+        pd.DataFrame (or PosteriorSummary if as_frame is False), three rows per experiment:
+            'theta_a':  summaries of the posterior of theta_a
+            'theta_b':  summaries of the posterior of theta_b
+            'delta':  summaries of the posterior of theta_b - theta_a (or of the metric)
+        """
+        if quantiles is None:
+            raise ValueError("quantiles must be a list of length > 0")
+        draws = self._get_draws(metric)
+        if names is None:
+            names = ["theta_a", "theta_b", _METRICS[metric]]
+        if len(names) > 3:
+            raise ValueError("names must be a list of length 3")
+        k = len(quantiles) + (mean is True)
+        q = np.empty((self.a.shape[0], 3, k * (1 + (mcse is True))))
+        for i, d in enumerate(draws):
+            q[:, i, : len(quantiles)] = np.quantile(d, quantiles, axis=1).T
+            if mean is True:
+                q[:, i, k - 1] = np.mean(d, axis=1)
+            if mcse is True:
+                q[:, i, k : k + len(quantiles)] = _quantile_mcse(d, quantiles)
+                if mean is True:
+                    q[:, i, -1] = _mean_mcse(d)
+        col_names = list(map(str, quantiles))
+        if mean is True:
+            col_names = col_names + ["mean"]
+        if mcse is True:
+            col_names = col_names + [i + "_mcse" for i in col_names]
+        return self._make_summary(q, col_names, names, as_frame)
+
+    def infer_delta_probability(
+        self, direction="greater than", value=0, metric="difference", mcse=False
+    ):
+        """
+        Estimates, for every experiment, the proportion of draws of the posterior delta to the right or
+        left of a given value
+        Parameters
+        ----------
+        direction: str, defines the direction of the inference, options 'greater than' or 'less than'.  Default is 'greater than'.
+        value: float,  defines the value about which to make the inference.  Default = 0.
+        metric:  str, metric comparing b with a, one of the metrics set at initialisation.  Default 'difference'
+        mcse:  boolean, also returns the binomial Monte Carlo standard errors of the probabilities.  Default False
+        Returns
+        -------
+        np.array[experiments], probability that b > (a + value) or b < (a + value) (or that the metric
+            is > or < value) for each experiment, NaN for experiments flagged as invalid
+        np.array[experiments], only if mcse is True, Monte Carlo standard error of each probability
+        """
+        dir_opts = ["greater than", "less than"]
+        if direction not in dir_opts:
+            raise ValueError("direction must be 'greater than' or 'less than'")
+        d_draw = self._get_draws(metric)[2]
+        if direction == "greater than":
+            p = np.count_nonzero(d_draw > value, axis=1) / self.n
+        else:
+            p = np.count_nonzero(d_draw < value, axis=1) / self.n
+        p[~self._valid] = np.nan
+        if mcse is True:
+            return p, _probability_mcse(p, self.n)
+        return p
+
+    def rope_summary(
+        self, widths, value=0, interval=0.95, as_frame=True, metric="difference"
+    ):
+        """
+        Summarises the posterior delta (or metric) of every experiment against regions of practical equivalence (ROPE)
+        of several widths around a value, from one sort of the draws
+        Parameters
+        ----------
+        widths: float or list, half widths of the ROPEs, each ROPE is value +/- width
+        value: float, centre of the ROPEs.  Default = 0
+        interval: float, defines the HDI interval used for the decision.  Default = 0.95 (i.e. 95% HDI interval)
+        as_frame:  boolean, returns a pd.DataFrame if True, otherwise a lightweight PosteriorSummary.  Default True
+        metric:  str, metric comparing b with a, one of the metrics set at initialisation.  Default 'difference'
+        Returns
+        -------
+        pd.DataFrame (or PosteriorSummary if as_frame is False), one row per experiment and width:
+            see BayesProportionsEstimation.rope_summary
+        """
+        widths = np.atleast_1d(np.asarray(widths, dtype=float))
+        if widths.ndim != 1 or len(widths) == 0 or np.any(widths < 0):
+            raise ValueError("widths must be a float or list of floats >= 0")
+        if interval is None or interval <= 0 or interval >= 1:
+            raise ValueError("interval must be a float > 0 and < 1")
+        sorted_draws = np.sort(self._get_draws(metric)[2], axis=1)
+        hdi_lower, hdi_upper = _sorted_hdi(sorted_draws, interval)
+        # Experiments flagged as invalid have NaN draws, so are left out of the search of the sorted draws
+        left, inside, right = np.full((3, self.a.shape[0], len(widths)), np.nan)
+        (
+            left[self._valid],
+            inside[self._valid],
+            right[self._valid],
+        ) = _rope_probabilities(sorted_draws[self._valid], value, widths)
+        decision = _rope_decision(hdi_lower, hdi_upper, value, widths)
+        decision[~self._valid] = "invalid"
+        experiments = self.a.shape[0]
+        q = np.column_stack(
+            [
+                np.tile(widths, experiments),
+                left.ravel(),
+                inside.ravel(),
+                right.ravel(),
+                np.repeat(hdi_lower, len(widths)),
+                np.repeat(hdi_upper, len(widths)),
+            ]
+        )
+        col_names = [
+            "width",
+            "left",
+            "inside",
+            "right",
+            "%.5g" % ((1 - interval) / 2),
+            "%.5g" % (interval + ((1 - interval) / 2)),
+        ]
+        summary = PosteriorSummary(
+            q,
+            col_names,
+            {
+                "experiment": np.repeat(self.labels, len(widths)),
+                "decision": decision.ravel(),
+            },
+        )
+        if as_frame is True:
+            return summary.to_frame()
+        return summary
@@ -3,7 +3,29 @@ import numpy as np
 import pandas as pd
 from plotly.subplots import make_subplots
 
-from bayespropestimation.bayesprophelpers import _calculate_map
+from bayespropestimation.bayespropasync import _run_coalesced
+from bayespropestimation.bayesprophelpers import (
+    _METRICS,
+    _beta_binomial_null_bayes_factor,
+    _beta_difference_cdf,
+    _betabinom_difference_pmf,
+    _betabinom_pmf,
+    _calculate_map,
+    _calculate_metric,
+    _discrete_quantiles,
+    _draws_dataset,
+    _empirical_quantiles,
+    _export_draws,
+    _is_seed,
+    _make_read_only,
+    _mean_mcse,
+    _probability_mcse,
+    _quantile_mcse,
+    _rope_decision,
+    _rope_probabilities,
+    _sorted_hdi,
+    _spawn_rng,
+)
 from bayespropestimation.bayespropplotters import (
     _get_centre_lines,
     _get_intervals,
@@ -13,10 +35,24 @@ from bayespropestimation.bayespropplotters import (
     _make_histogram_go,
     _make_line_go,
 )
+from bayespropestimation.bayespropshared import SharedPosteriorHandle
+from bayespropestimation.bayespropsummary import PosteriorSummary
 
 
 class BayesProportionsEstimation:
-    def __init__(self, a, b, prior_alpha=0.5, prior_beta=0.5, n=10000, seed=None):
+    def __init__(
+        self,
+        a,
+        b,
+        prior_alpha=0.5,
+        prior_beta=0.5,
+        n=10000,
+        seed=None,
+        mcse_target=None,
+        mcse_quantiles=[0.025, 0.5, 0.975],
+        max_n=1000000,
+        metrics=["difference"],
+    ):
         """
         Initialises the BayesProportionsEstimation class and samples from the posterior distribution
         Parameters
@@ -25,8 +61,28 @@ class BayesProportionsEstimation:
         b: list, ndarray or Series [successes, trials]:  array describing results from sample b
         prior_alpha: float, alpha parameter for the Beta prior distribution, default = 0.5 (Jeffreys prior)
         prior_beta: float, beta parameter for the Beta prior distribution, default = 0.5 (Jeffreys prior)
-        m: integer, number of samples to take from the posterior distribution, default = 10000
+        n: integer, number of samples to take from the posterior distribution, default = 10000
+            - if mcse_target is set, n is the size of the first batch of samples
         seed: integer, set random seed at the start of the initialisation, default = None
+        mcse_target: float, target Monte Carlo standard error for the probability that delta > 0
+            and for the mcse_quantiles of delta.  If set, samples are drawn in batches, doubling n
+            each time, until the target or max_n is reached.  Default = None (fixed n)
+        mcse_quantiles: list, quantiles of delta checked against mcse_target.  Default [0.025, 0.5, 0.975]
+        max_n: integer, maximum number of samples drawn when mcse_target is set.  Default = 1000000
+        metrics: list, metrics comparing b with a derived from the draws, selected in the other methods with
+            metric=.  Options 'difference' (b - a, always derived), 'relative lift' (b / a - 1) and
+            'log odds ratio' (log(b / (1 - b)) - log(a / (1 - a))).  Default ['difference']
+        Thread safety
+        -------------
+        Sampling uses a random state owned by the instance, never the global NumPy random state, so
+        instances created concurrently in different threads give the same draws as when created serially
+        with the same seeds.  The draws are read-only once sampled and no method modifies the instance, so
+        one instance can be shared by many threads.
+        Attributes
+        ----------
+        n: integer, number of samples actually drawn from the posterior distribution
+        mcse: float, achieved Monte Carlo standard error (largest of the delta probability and
+            mcse_quantiles errors), None if mcse_target is not set
         """
         self.a = a
         self.b = b
@@ -34,13 +90,18 @@ class BayesProportionsEstimation:
         self.prior_beta = prior_beta
         self.n = n
         self.seed = seed
+        self.mcse_target = mcse_target
+        self.mcse_quantiles = mcse_quantiles
+        self.max_n = max_n
+        self.metrics = metrics
+        self.mcse = None
         self._check_inputs()
         self._sample_posteriors()
 
     def _check_inputs(self):
         # Checks that parameters are in the correct format
-        types = ["list", "ndarray", "Series"]
-        if (type(self.a).__name__ not in types) or (type(self.b).__name__ not in types):
+        types = (list, np.ndarray, pd.Series)
+        if not isinstance(self.a, types) or not isinstance(self.b, types):
             raise ValueError(
                 "type(a).__name__ and/or type(b).__name__ must be 'list', 'ndarray' or 'DataFrame'"
             )
@@ -52,45 +113,182 @@ class BayesProportionsEstimation:
             raise ValueError("the prior_alpha and/or prior_beta parameters must be > 0")
         if self.n <= 0:
             raise ValueError("n must be a positive integer")
-        if self.seed is not None and str(self.seed).isdigit() == False:
+        if not _is_seed(self.seed):
             raise ValueError("seed must be a positive integer or None")
+        if self.mcse_target is not None:
+            if self.mcse_target <= 0:
+                raise ValueError("mcse_target must be a float > 0 or None")
+            if self.max_n < self.n:
+                raise ValueError("max_n must be an integer >= n")
+            if (
+                self.mcse_quantiles is None
+                or len(self.mcse_quantiles) == 0
+                or np.any(np.asarray(self.mcse_quantiles) <= 0)
+                or np.any(np.asarray(self.mcse_quantiles) >= 1)
+            ):
+                raise ValueError(
+                    "mcse_quantiles must be a list of floats > 0 and < 1 of length > 0"
+                )
+        if self.metrics is None or any(i not in _METRICS for i in self.metrics):
+            raise ValueError("metrics must be a list containing " + str(list(_METRICS)))
+
+    def _posterior_parameters(self, d):
+        # Defines the parameters of the Beta posterior
+        return d[0] + self.prior_alpha, d[1] - d[0] + self.prior_beta
 
-    def _posterior_function(self, d):
+    def _posterior_function(self, d, n=None):
         # Defines the posterior
-        return np.random.beta(
-            d[0] + self.prior_alpha, d[1] - d[0] + self.prior_beta, self.n
-        )
+        if n is None:
+            n = self.n
+        return self._random_state.beta(*self._posterior_parameters(d), n)
+
+    def _calculate_delta_mcse(self, d_draw):
+        # Largest Monte Carlo standard error of P(delta > 0) and the mcse_quantiles of delta
+        p = np.count_nonzero(d_draw > 0) / len(d_draw)
+        se_p = _probability_mcse(p, len(d_draw))
+        se_q = _quantile_mcse(d_draw, self.mcse_quantiles)
+        return max(se_p, np.max(se_q))
 
     def _sample_posteriors(self):
-        # Draws from posterior
-        np.random.seed(self.seed)
+        # Draws from posterior, in doubling batches until mcse_target is met if it is set,
+        # using a random state owned by the instance rather than the global NumPy random state
+        self._random_state = np.random.RandomState(self.seed)
         a_draw = self._posterior_function(self.a)
         b_draw = self._posterior_function(self.b)
         d_draw = b_draw - a_draw
+        if self.mcse_target is not None:
+            self.mcse = self._calculate_delta_mcse(d_draw)
+            while self.mcse > self.mcse_target and len(d_draw) < self.max_n:
+                batch = min(len(d_draw), self.max_n - len(d_draw))
+                a_draw = np.concatenate(
+                    [a_draw, self._posterior_function(self.a, batch)]
+                )
+                b_draw = np.concatenate(
+                    [b_draw, self._posterior_function(self.b, batch)]
+                )
+                d_draw = b_draw - a_draw
+                self.mcse = self._calculate_delta_mcse(d_draw)
+            self.n = len(d_draw)
         self.a_draw = a_draw
         self.b_draw = b_draw
         self.d_draw = d_draw
+        self.metric_draws = {"difference": d_draw}
+        for i in self.metrics:
+            if i not in self.metric_draws:
+                self.metric_draws[i] = _calculate_metric(a_draw, b_draw, i)
+        _make_read_only(a_draw, b_draw, *self.metric_draws.values())
 
-    def get_posteriors(self):
+    def _get_draws(self, metric):
+        # Retrieves the draws of a, b and of the metric comparing them
+        if metric not in self.metric_draws:
+            raise ValueError(
+                "metric must be one of the metrics set at initialisation "
+                + str(list(self.metric_draws))
+            )
+        return [self.a_draw, self.b_draw, self.metric_draws[metric]]
+
+    def _get_names(self, names, metric):
+        # Default parameter names for a metric, and check of the length of names
+        if names is None:
+            names = ["theta_a", "theta_b", _METRICS[metric]]
+        if len(names) > 3:
+            raise ValueError("names must be a list of length 3")
+        return names
+
+    def get_posteriors(self, metric="difference"):
         """
         Retrieves random draws from the posterior
+        Parameters
+        ----------
+        metric:  str, metric comparing b with a, one of the metrics set at initialisation.  Default 'difference'
         Returns
         -------
         tuple:
             - np.array[n] draws from the posterior of theta_a
             - np.array[n] draws from the posterior of theta_b
-            - np.array[n] draws from the posterior of theta_b minus draws from the posterior of theta_a
+            - np.array[n] draws from the posterior of the metric, by default theta_b minus theta_a
+        """
+        return tuple(self._get_draws(metric))
+
+    def share_draws(self, path=None):
+        """
+        Copies the draws into shared memory, or into a memory-mapped file if path is given, so that worker
+        processes can compute summaries and plots from them without a pickled copy of the draws each
+        Parameters
+        ----------
+        path: str, path of a memory-mapped file to hold the draws.  Default None (multiprocessing.shared_memory)
+        Returns
+        -------
+        SharedPosteriorHandle, picklable handle to send to the workers, where handle.attach() returns the
+            estimator backed by the shared draws.  Call handle.unlink() (or use the handle in a with block)
+            in this process once the workers are finished
+        """
+        return SharedPosteriorHandle(self, path)
+
+    def _export_attrs(self):
+        # Counts and priors recorded alongside exported draws
+        attrs = {
+            "a_successes": self.a[0],
+            "a_trials": self.a[1],
+            "b_successes": self.b[0],
+            "b_trials": self.b[1],
+            "prior_alpha": self.prior_alpha,
+            "prior_beta": self.prior_beta,
+        }
+        if self.seed is not None:
+            attrs["seed"] = self.seed
+        return attrs
+
+    def to_dataset(self, names=None, metrics=None):
         """
-        return (self.a_draw, self.b_draw, self.d_draw)
+        Wraps the draws in an xarray Dataset without copying them
+        Parameters
+        ----------
+        names: list, variable names in order: a, b, then one per metric.  Default ['theta_a', 'theta_b', 'delta', ...]
+        metrics: list, metrics comparing b with a to include, from the metrics set at initialisation.  Default None (all)
+        Returns
+        -------
+        xr.Dataset, one variable per parameter with dims (chain, draw), a single chain of n draws, with the
+            counts and priors as attributes
+        """
+        draws, names = _export_draws(
+            self.a_draw, self.b_draw, self.metric_draws, names, metrics
+        )
+        return _draws_dataset(draws, names, self._export_attrs())
 
-    def _calculate_quantiles(self, d, mean, quantiles):
-        # Calculate mean and quantiles
+    def to_inference_data(self, names=None, metrics=None):
+        """
+        Wraps the draws in an ArviZ InferenceData without copying them, for use with ArviZ diagnostics and plots
+        Parameters
+        ----------
+        names: list, variable names in order: a, b, then one per metric.  Default ['theta_a', 'theta_b', 'delta', ...]
+        metrics: list, metrics comparing b with a to include, from the metrics set at initialisation.  Default None (all)
+        Returns
+        -------
+        az.InferenceData, with the posterior group returned by to_dataset
+        """
+        return az.InferenceData(posterior=self.to_dataset(names, metrics))
+
+    def _calculate_quantiles(self, d, mean, quantiles, mcse=False):
+        # Calculate mean and quantiles, followed by their Monte Carlo standard errors if mcse is True
         q = np.quantile(d, quantiles)
         if mean is True:
             q = np.append(q, np.mean(d))
+        if mcse is True:
+            q = np.append(q, _quantile_mcse(d, quantiles))
+            if mean is True:
+                q = np.append(q, _mean_mcse(d))
         return q
 
-    def quantile_summary(self, mean=True, quantiles=[0.025, 0.5, 0.975], names=None):
+    def quantile_summary(
+        self,
+        mean=True,
+        quantiles=[0.025, 0.5, 0.975],
+        names=None,
+        as_frame=True,
+        metric="difference",
+        mcse=False,
+    ):
         """
         Summarises the properties of the estimated posterior using quantiles
         Parameters
@@ -98,41 +296,100 @@ class BayesProportionsEstimation:
         mean:  boolean, default True, calculates the mean of the draws from the posterior.  Default True
         quantiles: list, calculates the quantiles of the draws from the posterior.  Default [0.025, 0.5, 0.975]
         names:  list of length 3, parameter names in order: a, b, b-a.  Default ['theta_a', 'theta_b', 'delta']
+        as_frame:  boolean, returns a pd.DataFrame if True, otherwise a lightweight PosteriorSummary.  Default True
+        metric:  str, metric comparing b with a, one of the metrics set at initialisation.  Default 'difference'
+        mcse:  boolean, adds the Monte Carlo standard error of each quantile (from the spread of the order
+            statistics about its rank) and of the mean, in columns suffixed '_mcse'.  Default False
         Returns
         -------
-        pd.DataFrame:
+        pd.DataFrame (or PosteriorSummary if as_frame is False):
             'theta_a':  summaries of the posterior of theta_a
             'theta_b':  summaries of the posterior of theta_b
-            'delta':  summaries of the posterior of theta_b - theta_a
+            'delta':  summaries of the posterior of theta_b - theta_a (or of the metric)
         """
         if quantiles is None:
             raise ValueError("quantiles must be a list of length > 0")
-        draws = [self.a_draw, self.b_draw, self.d_draw]
-        if names is None:
-            names = ["theta_a", "theta_b", "delta"]
-        if len(names) > 3:
-            raise ValueError("names must be a list of length 3")
-        q = []
-        for i in draws:
-            q.append(self._calculate_quantiles(i, mean, quantiles))
-        df = pd.DataFrame(np.array(q))
+        draws = self._get_draws(metric)
+        names = self._get_names(names, metric)
+        q = np.empty((3, (len(quantiles) + (mean is True)) * (1 + (mcse is True))))
+        for i in range(0, 3):
+            q[i] = self._calculate_quantiles(draws[i], mean, quantiles, mcse)
+        col_names = list(map(str, quantiles))
         if mean is True:
-            df.columns = list(map(str, quantiles)) + ["mean"]
-        else:
-            df.columns = list(map(str, quantiles))
-        df["parameter"] = names
-        return df
+            col_names = col_names + ["mean"]
+        if mcse is True:
+            col_names = col_names + [i + "_mcse" for i in col_names]
+        summary = PosteriorSummary(q, col_names, {"parameter": names})
+        if as_frame is True:
+            return summary.to_frame()
+        return summary
 
-    def _calculate_hdi_and_map(self, d, mean, interval):
-        # Calculate HDI interval and MAP
-        q = az.hdi(d, hdi_prob=interval)
+    async def quantile_summary_async(
+        self,
+        mean=True,
+        quantiles=[0.025, 0.5, 0.975],
+        names=None,
+        as_frame=True,
+        metric="difference",
+        mcse=False,
+        executor=None,
+    ):
+        """
+        Asynchronous counterpart of quantile_summary, the calculation is run in an executor
+        so that it does not block the event loop.  Concurrent calls with the same arguments
+        share one calculation, each returning its own copy of the result.
+        Parameters
+        ----------
+        mean, quantiles, names, as_frame, metric, mcse:  see quantile_summary
+        executor:  concurrent.futures.Executor, executor to run the calculation in.  Default None (the event loop's default executor)
+        Returns
+        -------
+        pd.DataFrame or PosteriorSummary:  see quantile_summary
+        """
+        # The summary is calculated once and each caller gets its own copy of it
+        summary = (
+            await _run_coalesced(
+                (id(self), "quantile_summary", mean, quantiles, names, metric, mcse),
+                lambda: self.quantile_summary(
+                    mean=mean,
+                    quantiles=quantiles,
+                    names=names,
+                    as_frame=False,
+                    metric=metric,
+                    mcse=mcse,
+                ),
+                executor,
+            )
+        ).copy()
+        if as_frame is True:
+            return summary.to_frame()
+        return summary
+
+    def _calculate_hdi_and_map(self, d, mean, interval, mcse=False):
+        # Calculate HDI interval and MAP, followed by their Monte Carlo standard errors if mcse is True
+        h = az.hdi(d, hdi_prob=interval)
         m = _calculate_map(d)
-        q = np.array([q[0], m, q[1]])
+        q = np.array([h[0], m, h[1]])
         if mean is True:
             q = np.append(q, np.mean(d))
+        if mcse is True:
+            # The HDI bounds are order statistics, so use the quantile errors at their ranks
+            ranks = np.array([np.count_nonzero(d < h[0]), np.count_nonzero(d <= h[1])])
+            se = _quantile_mcse(d, np.clip(ranks / len(d), 0, 1))
+            q = np.append(q, [se[0], np.nan, se[1]])
+            if mean is True:
+                q = np.append(q, _mean_mcse(d))
         return q
 
-    def hdi_summary(self, mean=True, interval=0.95, names=None):
+    def hdi_summary(
+        self,
+        mean=True,
+        interval=0.95,
+        names=None,
+        as_frame=True,
+        metric="difference",
+        mcse=False,
+    ):
         """
         Summarises the properties of the estimated posterior using the MAP and HDI
         Parameters
@@ -140,35 +397,164 @@ class BayesProportionsEstimation:
         mean:  boolean, calculates the mean of the draws from the posterior.  Default True
         interval: float, defines the HDI interval.  Default = 0.95 (i.e. 95% HDI interval)
         names:  list of length 3, parameter names in order: a, b, b-a.  Default ['theta_a', 'theta_b', 'delta']
+        as_frame:  boolean, returns a pd.DataFrame if True, otherwise a lightweight PosteriorSummary.  Default True
+        metric:  str, metric comparing b with a, one of the metrics set at initialisation.  Default 'difference'
+        mcse:  boolean, adds the Monte Carlo standard error of the HDI bounds (from the spread of the order
+            statistics about their ranks) and of the mean, in columns suffixed '_mcse'.  The MAP error is
+            not estimated and is NaN.  Default False
         Returns
         -------
-        pd.DataFrame:
+        pd.DataFrame (or PosteriorSummary if as_frame is False):
             'theta_a':  summaries of the posterior of theta_a
             'theta_b':  summaries of the posterior of theta_b
-            'delta':  summaries of the posterior of theta_b - theta_a
+            'delta':  summaries of the posterior of theta_b - theta_a (or of the metric)
         """
         if interval is None or interval <= 0 or interval >= 1:
             raise ValueError("interval must be a float > 0 and < 1")
-        draws = [self.a_draw, self.b_draw, self.d_draw]
-        if names is None:
-            names = ["theta_a", "theta_b", "delta"]
-        if len(names) > 3:
-            raise ValueError("names must be a list of length 3")
-        q = []
-        for i in draws:
-            q.append(self._calculate_hdi_and_map(i, mean, interval))
-        df = pd.DataFrame(np.array(q))
+        draws = self._get_draws(metric)
+        names = self._get_names(names, metric)
+        q = np.empty((3, (3 + (mean is True)) * (1 + (mcse is True))))
+        for i in range(0, 3):
+            q[i] = self._calculate_hdi_and_map(draws[i], mean, interval, mcse)
         col_names = [
             "%.5g" % ((1 - interval) / 2),
             "MAP",
             "%.5g" % (interval + ((1 - interval) / 2)),
         ]
         if mean is True:
-            df.columns = col_names + ["mean"]
+            col_names = col_names + ["mean"]
+        if mcse is True:
+            col_names = col_names + [i + "_mcse" for i in col_names]
+        summary = PosteriorSummary(q, col_names, {"parameter": names})
+        if as_frame is True:
+            return summary.to_frame()
+        return summary
+
+    async def hdi_summary_async(
+        self,
+        mean=True,
+        interval=0.95,
+        names=None,
+        as_frame=True,
+        metric="difference",
+        mcse=False,
+        executor=None,
+    ):
+        """
+        Asynchronous counterpart of hdi_summary, the HDI and MAP (KDE) calculations are run in an
+        executor so that they do not block the event loop.  Concurrent calls with the same arguments
+        share one calculation, each returning its own copy of the result.
+        Parameters
+        ----------
+        mean, interval, names, as_frame, metric, mcse:  see hdi_summary
+        executor:  concurrent.futures.Executor, executor to run the calculation in.  Default None (the event loop's default executor)
+        Returns
+        -------
+        pd.DataFrame or PosteriorSummary:  see hdi_summary
+        """
+        # The summary is calculated once and each caller gets its own copy of it
+        summary = (
+            await _run_coalesced(
+                (id(self), "hdi_summary", mean, interval, names, metric, mcse),
+                lambda: self.hdi_summary(
+                    mean=mean,
+                    interval=interval,
+                    names=names,
+                    as_frame=False,
+                    metric=metric,
+                    mcse=mcse,
+                ),
+                executor,
+            )
+        ).copy()
+        if as_frame is True:
+            return summary.to_frame()
+        return summary
+
+    def _calculate_predictive(self, m, mean, quantiles, max_analytic):
+        # Calculate quantiles and mean of the posterior predictive successes in m future trials
+        # for a, b and b-a, analytically (beta-binomial) or from draws if m exceeds max_analytic
+        alpha_a, beta_a = self._posterior_parameters(self.a)
+        alpha_b, beta_b = self._posterior_parameters(self.b)
+        q = np.empty((3, len(quantiles) + (mean is True)))
+        if m <= max_analytic:
+            support = np.arange(0, m + 1)
+            q[0, : len(quantiles)] = _discrete_quantiles(
+                support, _betabinom_pmf(m, alpha_a, beta_a), quantiles
+            )
+            q[1, : len(quantiles)] = _discrete_quantiles(
+                support, _betabinom_pmf(m, alpha_b, beta_b), quantiles
+            )
+            q[2, : len(quantiles)] = _discrete_quantiles(
+                np.arange(-m, m + 1),
+                _betabinom_difference_pmf(m, alpha_a, beta_a, alpha_b, beta_b),
+                quantiles,
+            )
         else:
-            df.columns = col_names
-        df["parameter"] = names
-        return df
+            rng = _spawn_rng(self.seed, m)
+            a_pred = rng.binomial(m, self.a_draw)
+            b_pred = rng.binomial(m, self.b_draw)
+            q[0, : len(quantiles)] = _empirical_quantiles(a_pred, quantiles)
+            q[1, : len(quantiles)] = _empirical_quantiles(b_pred, quantiles)
+            q[2, : len(quantiles)] = _empirical_quantiles(b_pred - a_pred, quantiles)
+        if mean is True:
+            q[0, -1] = m * alpha_a / (alpha_a + beta_a)
+            q[1, -1] = m * alpha_b / (alpha_b + beta_b)
+            q[2, -1] = q[1, -1] - q[0, -1]
+        return q
+
+    def predictive_summary(
+        self,
+        m,
+        mean=True,
+        quantiles=[0.025, 0.5, 0.975],
+        names=None,
+        max_analytic=100000,
+        as_frame=True,
+    ):
+        """
+        Summarises the posterior predictive distribution of the number of successes in m future trials
+        for samples a and b, and of the difference in successes (b - a), for one or many horizons m.
+        Applies only to the difference: the relative lift and log odds ratio of predicted counts are
+        undefined whenever a predicted count is 0, so there is no metric argument.
+        Parameters
+        ----------
+        m:  integer or list of integers, number of future trials per sample (the forecast horizons)
+        mean:  boolean, calculates the mean of the posterior predictive distribution.  Default True
+        quantiles: list, calculates the quantiles of the posterior predictive distribution.  Default [0.025, 0.5, 0.975]
+        names:  list of length 3, parameter names in order: a, b, b-a.  Default ['theta_a', 'theta_b', 'delta']
+        max_analytic:  integer, largest horizon calculated analytically from the beta-binomial distribution,
+            larger horizons are simulated from the draws from the posterior.  Default 100000
+        as_frame:  boolean, returns a pd.DataFrame if True, otherwise a lightweight PosteriorSummary.  Default True
+        Returns
+        -------
+        pd.DataFrame (or PosteriorSummary if as_frame is False), three rows per horizon:
+            'theta_a':  summaries of the predicted successes for a in m trials
+            'theta_b':  summaries of the predicted successes for b in m trials
+            'delta':  summaries of the predicted successes for b minus those for a
+        """
+        if quantiles is None:
+            raise ValueError("quantiles must be a list of length > 0")
+        m = np.atleast_1d(m)
+        if m.ndim != 1 or len(m) == 0 or np.any(m < 0) or np.any(m != np.round(m)):
+            raise ValueError("m must be a non-negative integer or list of integers")
+        m = m.astype(int)
+        if names is None:
+            names = ["theta_a", "theta_b", "delta"]
+        if len(names) > 3:
+            raise ValueError("names must be a list of length 3")
+        q = np.concatenate(
+            [self._calculate_predictive(i, mean, quantiles, max_analytic) for i in m]
+        )
+        col_names = list(map(str, quantiles))
+        if mean is True:
+            col_names = col_names + ["mean"]
+        summary = PosteriorSummary(
+            q, col_names, {"m": np.repeat(m, 3), "parameter": np.tile(names, len(m))}
+        )
+        if as_frame is True:
+            return summary.to_frame()
+        return summary
 
     def _probability_interpretation_guide(self, p):
         # Interpretation guide for probabilities using:
@@ -200,7 +586,13 @@ class BayesProportionsEstimation:
         return s
 
     def infer_delta_probability(
-        self, direction="greater than", value=0, print_inference=True, names=None
+        self,
+        direction="greater than",
+        value=0,
+        print_inference=True,
+        names=None,
+        metric="difference",
+        mcse=False,
     ):
         """
         Provides a guide to making inferences on the posterior delta, based on proportion of
@@ -211,26 +603,29 @@ class BayesProportionsEstimation:
         value: float,  defines the value about which to make the inference.  Default = 0.
         print_inference:  boolean, prints a readable string.  Default is True.
         names:  list of length 3, parameter names in order: a, b, b-a.  Default ['theta_a', 'theta_b', 'delta']
+        metric:  str, metric comparing b with a, one of the metrics set at initialisation.  Default 'difference'
+        mcse:  boolean, also returns the Monte Carlo standard error of the probability.  Default False
         Returns
         -------
         tuple
-            - float, probability that b > (a + value) or b < (a + value).
+            - float, probability that b > (a + value) or b < (a + value) (or that the metric is > or < value).
             - str, string interpretation of that probabiliyu
+            - float, only if mcse is True, binomial Monte Carlo standard error of the probability
         """
         dir_opts = ["greater than", "less than"]
         if direction not in dir_opts:
             raise ValueError("direction must be 'greater than' or 'less than'")
+        d_draw = self._get_draws(metric)[2]
         if direction == "greater than":
-            p = len(self.d_draw[self.d_draw > 0]) / len(self.d_draw)
+            p = np.count_nonzero(d_draw > value) / len(d_draw)
         else:
-            p = len(self.d_draw[self.d_draw < 0]) / len(self.d_draw)
+            p = np.count_nonzero(d_draw < value) / len(d_draw)
         i = self._probability_interpretation_guide(p)
-        if names is None:
-            names = ["theta_a", "theta_b", "delta"]
-        if len(names) > 3:
-            raise ValueError("names must be a list of length 3")
+        names = self._get_names(names, metric)
         if print_inference is True:
             print(self._print_inference_probability(p, i, direction, value, names))
+        if mcse is True:
+            return p, i, _probability_mcse(p, len(d_draw))
         return p, i
 
     def _bayes_factor_interpretation_guide(self, bf):
@@ -285,13 +680,18 @@ class BayesProportionsEstimation:
     def _estimate_bayes_factor(self, p_h1, p_h2):
         # Estimates bayes Factor
         if p_h2 == 0:
-            k = np.Infinity
+            k = np.inf
         else:
             k = p_h1 / p_h2
         return k
 
     def infer_delta_bayes_factor(
-        self, direction="greater than", value=0, print_inference=True, names=None
+        self,
+        direction="greater than",
+        value=0,
+        print_inference=True,
+        names=None,
+        metric="difference",
     ):
         """
         Provides a guide to making inferences on the posterior delta, based on the Bayes Factor by estimating
@@ -303,6 +703,7 @@ class BayesProportionsEstimation:
         value: float,  defines the value about which to make the inference.  Default = 0.
         print_inference:  boolean, prints a readable string.  Default is True.
         names:  list of length 3, parameter names in order: a, b, b-a.  Default ['theta_a', 'theta_b', 'delta']
+        metric:  str, metric comparing b with a, one of the metrics set at initialisation.  Default 'difference'
         Returns
         -------
         tuple
@@ -312,23 +713,169 @@ class BayesProportionsEstimation:
         dir_opts = ["greater than", "less than"]
         if direction not in dir_opts:
             raise ValueError("direction must be 'greater than' or 'less than'")
+        d_draw = self._get_draws(metric)[2]
         if direction == "greater than":
-            p_h1 = len(self.d_draw[self.d_draw > value]) / len(self.d_draw)
+            p_h1 = np.count_nonzero(d_draw > value) / len(d_draw)
             p_h2 = 1 - p_h1
             bf = self._estimate_bayes_factor(p_h1, p_h2)
         else:
-            p_h1 = len(self.d_draw[self.d_draw < value]) / len(self.d_draw)
+            p_h1 = np.count_nonzero(d_draw < value) / len(d_draw)
             p_h2 = 1 - p_h1
             bf = self._estimate_bayes_factor(p_h1, p_h2)
         i = self._bayes_factor_interpretation_guide(bf)
-        if names is None:
-            names = ["theta_a", "theta_b", "delta"]
-        if len(names) > 3:
-            raise ValueError("names must be a list of length 3")
+        names = self._get_names(names, metric)
         if print_inference is True:
             print(self._print_inference_bayes_factor(bf, i, direction, value, names))
         return bf, i
 
+    def rope_summary(
+        self, widths, value=0, interval=0.95, as_frame=True, metric="difference"
+    ):
+        """
+        Summarises the posterior delta (or metric) against regions of practical equivalence (ROPE) of
+        several widths around a value, from one sort of the draws
+        Parameters
+        ----------
+        widths: float or list, half widths of the ROPEs, each ROPE is value +/- width
+        value: float, centre of the ROPEs.  Default = 0
+        interval: float, defines the HDI interval used for the decision.  Default = 0.95 (i.e. 95% HDI interval)
+        as_frame:  boolean, returns a pd.DataFrame if True, otherwise a lightweight PosteriorSummary.  Default True
+        metric:  str, metric comparing b with a, one of the metrics set at initialisation.  Default 'difference'
+        Returns
+        -------
+        pd.DataFrame (or PosteriorSummary if as_frame is False), one row per width:
+            'width':  half width of the ROPE
+            'left', 'inside', 'right':  proportion of the posterior delta left of, inside and right of the ROPE
+            HDI bounds:  lower and upper bounds of the HDI of delta
+            'decision':  'reject null' if the HDI is entirely outside the ROPE, 'accept null' if it is
+                entirely inside and 'undecided' otherwise
+        """
+        widths = np.atleast_1d(np.asarray(widths, dtype=float))
+        if widths.ndim != 1 or len(widths) == 0 or np.any(widths < 0):
+            raise ValueError("widths must be a float or list of floats >= 0")
+        if interval is None or interval <= 0 or interval >= 1:
+            raise ValueError("interval must be a float > 0 and < 1")
+        sorted_draws = np.sort(self._get_draws(metric)[2])[None, :]
+        left, inside, right = _rope_probabilities(sorted_draws, value, widths)
+        hdi_lower, hdi_upper = _sorted_hdi(sorted_draws, interval)
+        q = np.column_stack(
+            [
+                widths,
+                left[0],
+                inside[0],
+                right[0],
+                np.repeat(hdi_lower, len(widths)),
+                np.repeat(hdi_upper, len(widths)),
+            ]
+        )
+        col_names = [
+            "width",
+            "left",
+            "inside",
+            "right",
+            "%.5g" % ((1 - interval) / 2),
+            "%.5g" % (interval + ((1 - interval) / 2)),
+        ]
+        summary = PosteriorSummary(
+            q,
+            col_names,
+            {"decision": _rope_decision(hdi_lower, hdi_upper, value, widths)[0]},
+        )
+        if as_frame is True:
+            return summary.to_frame()
+        return summary
+
+    def _print_inference_null_bayes_factor(self, bf, i, value, rope, names, metric):
+        # Combines null hypothesis bayes factor values into a readable string
+        s = "The calculated bayes factor for the hypothesis that "
+        if metric == "difference":
+            s = s + names[1] + " - " + names[0]
+        else:
+            s = s + "the " + metric + " of " + names[1] + " over " + names[0]
+        if rope is None:
+            s = s + " is not equal to " + str(value)
+        else:
+            s = s + " is outside " + str(value) + " +/- " + str(rope)
+        s = s + " versus the hypothesis that it is "
+        if rope is None:
+            s = s + "equal to " + str(value)
+        else:
+            s = s + "inside " + str(value) + " +/- " + str(rope)
+        s = s + " is "
+        if np.isinf(bf):
+            s = s + "more than 100"
+        else:
+            s = s + ("%.5g" % bf)
+        s = s + ". Therefore the strength of evidence for this hypothesis is " + i + "."
+        return s
+
+    def infer_delta_null_bayes_factor(
+        self, value=0, rope=None, print_inference=True, names=None, metric="difference"
+    ):
+        """
+        Provides a guide to making inferences on delta based on the Bayes Factor P(D|H1) / P(D|H0) for a
+        null hypothesis H0 that delta equals a value (point null) or lies within a region of practical
+        equivalence around it (ROPE null), versus H1 that it does not.  Where D denotes the observed data.
+        Calculated in closed form or by 1-D quadrature rather than from the draws, so the result is stable
+        and finite whatever n is.
+            - point null:  ratio of the beta-binomial marginal likelihoods of theta_a, theta_b independent
+              versus theta_b = theta_a + value, with the Beta prior on theta_a restricted to where theta_b
+              is in [0, 1].  Closed form for value = 0, and continuous in value, for any prior
+            - ROPE null:  posterior odds of delta being outside versus inside value +/- rope, divided by
+              the prior odds
+        For a metric other than the difference, H0 is that the metric equals value (or lies within
+        value +/- rope), e.g. theta_b = theta_a * (1 + value) for the relative lift.
+        Parameters
+        ----------
+        value: float,  defines the value of delta under the null hypothesis.  Default = 0.
+        rope: float, half width of the region of practical equivalence about value.  Default = None (point null)
+        print_inference:  boolean, prints a readable string.  Default is True.
+        names:  list of length 3, parameter names in order: a, b, b-a.  Default ['theta_a', 'theta_b', 'delta']
+        metric:  str, metric comparing b with a, one of 'difference', 'relative lift' or 'log odds ratio'.
+            Calculated from the counts, so need not be set at initialisation.  Default 'difference'
+        Returns
+        -------
+        tuple
+            - float, bayes factor P(D|H1) / P(D|H0)
+            - str, string interpretation of that bayes factor
+        """
+        if metric not in _METRICS:
+            raise ValueError("metric must be one of " + str(list(_METRICS)))
+        if metric == "difference" and (value <= -1 or value >= 1):
+            raise ValueError("value must be a float > -1 and < 1")
+        if metric == "relative lift" and value <= -1:
+            raise ValueError("value must be a float > -1 for the relative lift")
+        if not np.isfinite(value):
+            raise ValueError("value must be a finite float")
+        if rope is not None and rope <= 0:
+            raise ValueError("rope must be a float > 0 or None")
+        names = self._get_names(names, metric)
+        prior = (self.prior_alpha, self.prior_beta) * 2
+        posterior = self._posterior_parameters(self.a) + self._posterior_parameters(
+            self.b
+        )
+        if rope is None:
+            bf = _beta_binomial_null_bayes_factor(
+                self.a, self.b, self.prior_alpha, self.prior_beta, value, metric
+            )
+        else:
+            p_prior, p_post = [
+                _beta_difference_cdf(value + rope, *d, metric)
+                - _beta_difference_cdf(value - rope, *d, metric)
+                for d in (prior, posterior)
+            ]
+            bf = self._estimate_bayes_factor(
+                (1 - p_post) * p_prior, p_post * (1 - p_prior)
+            )
+        i = self._bayes_factor_interpretation_guide(bf)
+        if print_inference is True:
+            print(
+                self._print_inference_null_bayes_factor(
+                    bf, i, value, rope, names, metric
+                )
+            )
+        return bf, i
+
     def posterior_plot(
         self,
         method="hdi",
@@ -337,6 +884,7 @@ class BayesProportionsEstimation:
         bounds=None,
         names=None,
         fig_size=None,
+        metric="difference",
     ):
         """
         Plots the density of the draws from the posterior distribution
@@ -352,6 +900,8 @@ class BayesProportionsEstimation:
             - if method = 'quantile': list, defines the credible interval.  Default = [0.025, 0.975]
         names: list of length 3, parameter names for the plot.  Default ['theta_a', 'theta_b', 'delta']
         fig_size:  tuple(width, height), dimensions of plot.  Default is None
+        metric:  str, metric comparing b with a plotted in place of delta, one of the metrics set at
+            initialisation.  Default 'difference'
         """
         valid_methods = ["hdi", "quantile"]
         if method not in valid_methods:
@@ -366,10 +916,8 @@ class BayesProportionsEstimation:
             )
         if method == "quantiles" and len(bounds) != 2:
             raise ValueError("quantiles must be a list of length 2")
-        if names is None:
-            names = ["theta_a", "theta_b", "delta"]
-        if len(names) > 3:
-            raise ValueError("names must be a list of length 3")
+        draws = self._get_draws(metric)
+        names = self._get_names(names, metric)
         if method == "hdi":
             interval_name = "hdi"
             centre_line_name = "map"
@@ -383,7 +931,6 @@ class BayesProportionsEstimation:
             shared_yaxes=False,
             subplot_titles=tuple(names),
         )
-        draws = [self.a_draw, self.b_draw, self.d_draw]
         for i in range(0, 3):
             cl = _get_centre_lines(draws[i], method=method)
             intervals = _get_intervals(draws[i], method=method, bounds=bounds)
@@ -397,7 +944,7 @@ class BayesProportionsEstimation:
             fig.add_trace(
                 _make_area_go(intervals, name=interval_name, col=col), 1, i + 1
             )
-        fig.update_layout(shapes=[_make_delta_line(self.d_draw, delta_line=delta_line)])
+        fig.update_layout(shapes=[_make_delta_line(draws[2], delta_line=delta_line)])
         fig.update_yaxes(title_text="density", row=1, col=1)
         name_set = set()
         fig.for_each_trace(
@@ -408,3 +955,25 @@ class BayesProportionsEstimation:
         if fig_size is not None:
             fig.update_layout(height=fig_size[1], width=fig_size[0])
         return fig
+
+
+async def estimate_async(a, b, executor=None, **kwargs):
+    """
+    Asynchronously initialises the BayesProportionsEstimation class, sampling from the posterior
+    distribution in an executor so that it does not block the event loop.  Concurrent calls with the
+    same arguments share one sampling run and return the same instance.
+    Parameters
+    ----------
+    a: list, ndarray or Series [successes, trials]:  array describing results from sample a
+    b: list, ndarray or Series [successes, trials]:  array describing results from sample b
+    executor:  concurrent.futures.Executor, executor to sample in.  Default None (the event loop's default executor)
+    **kwargs:  further arguments passed to BayesProportionsEstimation
+    Returns
+    -------
+    BayesProportionsEstimation
+    """
+    return await _run_coalesced(
+        ("estimate", a, b, kwargs),
+        lambda: BayesProportionsEstimation(a, b, **kwargs),
+        executor,
+    )
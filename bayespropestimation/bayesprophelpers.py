@@ -1,12 +1,65 @@
 import numpy as np
 import scipy as scipy
+import scipy.integrate
+import scipy.optimize
+import scipy.signal
+import scipy.special
+import scipy.stats
+import xarray as xr
+
+# Largest number of kernel evaluations held in memory at once by the KDE
+_KDE_CHUNK_ELEMENTS = 2**20
+# Largest number of draws x grid points evaluated exactly by the KDE, beyond which the draws are binned
+_KDE_MAX_EXACT = 10**8
+# Number of bins used by the binned KDE
+_KDE_BINS = 2**14
+
+
+def _kde_bandwidth(draws):
+    # Gaussian kernel bandwidth using Scott's rule, as scipy.stats.gaussian_kde
+    return np.std(draws, ddof=1) * np.power(len(draws), -1 / 5)
+
+
+def _exact_kde(draws, x, bw):
+    # Evaluates the Gaussian KDE at x exactly, summing over chunks of the draws so that at most
+    # _KDE_CHUNK_ELEMENTS kernel values are held in memory at once
+    density = np.zeros(len(x))
+    step = max(1, _KDE_CHUNK_ELEMENTS // len(x))
+    for i in range(0, len(draws), step):
+        z = (x[:, None] - draws[None, i : i + step]) / bw
+        density += np.sum(np.exp(-0.5 * z * z), axis=1)
+    return density / (len(draws) * bw * np.sqrt(2 * np.pi))
+
+
+def _binned_kde(draws, x, bw):
+    # Approximates the Gaussian KDE at x by linearly binning the draws onto _KDE_BINS bins,
+    # convolving with the kernel and interpolating, memory is bounded whatever the number of draws
+    lower = np.min(draws) - 5 * bw
+    upper = np.max(draws) + 5 * bw
+    delta = (upper - lower) / (_KDE_BINS - 1)
+    counts = np.zeros(_KDE_BINS)
+    for i in range(0, len(draws), _KDE_CHUNK_ELEMENTS):
+        position = (draws[i : i + _KDE_CHUNK_ELEMENTS] - lower) / delta
+        index = np.minimum(np.floor(position).astype(int), _KDE_BINS - 2)
+        weight = position - index
+        counts += np.bincount(index, weights=1 - weight, minlength=_KDE_BINS)
+        counts += np.bincount(index + 1, weights=weight, minlength=_KDE_BINS)
+    half_width = min(int(np.ceil(5 * bw / delta)), _KDE_BINS - 1)
+    z = np.arange(-half_width, half_width + 1) * delta / bw
+    density = scipy.signal.fftconvolve(counts, np.exp(-0.5 * z * z), mode="same")
+    density = np.clip(density, 0, None) / (len(draws) * bw * np.sqrt(2 * np.pi))
+    return np.interp(x, lower + np.arange(0, _KDE_BINS) * delta, density)
 
 
 def _calculate_kde(draws, num=10000):
-    # Estimates a KDE distribution from the posterior draws
-    kde = scipy.stats.gaussian_kde(draws)
+    # Estimates a KDE distribution from the posterior draws, using a Gaussian kernel with the bandwidth
+    # of scipy.stats.gaussian_kde, evaluated exactly in chunks or, for large draws x num, from binned draws
+    bw = _kde_bandwidth(draws)
     x = np.linspace(np.min(draws), np.max(draws), num=num)
-    kde_density = kde(x)
+    if len(draws) * num <= _KDE_MAX_EXACT:
+        kde_density = _exact_kde(draws, x, bw)
+    else:
+        kde_density = _binned_kde(draws, x, bw)
     return x, kde_density
 
 
@@ -14,3 +67,330 @@ def _calculate_map(draws, num=10000):
     # Estimates the MAP based on the maxima of the KDE estimate
     x, kde_density = _calculate_kde(draws, num=num)
     return x[np.argmax(kde_density)]
+
+
+def _probability_mcse(p, n):
+    # Monte Carlo standard error of a probability estimated from n independent draws
+    return np.sqrt(p * (1 - p) / n)
+
+
+def _quantile_mcse(draws, quantiles):
+    # Monte Carlo standard error of quantiles of the draws (along the last axis), using the spread of
+    # the order statistics one binomial standard deviation either side of the rank of each quantile
+    n = draws.shape[-1]
+    quantiles = np.asarray(quantiles, dtype=float)
+    sd = np.sqrt(n * quantiles * (1 - quantiles))
+    lower = np.clip(np.floor(n * quantiles - sd), 0, n - 1).astype(int)
+    upper = np.clip(np.ceil(n * quantiles + sd), 0, n - 1).astype(int)
+    ranks = np.unique(np.concatenate([lower, upper]))
+    partitioned = np.partition(draws, ranks, axis=-1)
+    return (partitioned[..., upper] - partitioned[..., lower]) / 2
+
+
+def _mean_mcse(draws):
+    # Monte Carlo standard error of the mean of independent draws (along the last axis)
+    return np.std(draws, ddof=1, axis=-1) / np.sqrt(draws.shape[-1])
+
+
+def _betabinom_pmf(m, alpha, beta):
+    # Probability mass of the beta-binomial distribution over the support 0..m
+    return scipy.stats.betabinom.pmf(np.arange(0, m + 1), m, alpha, beta)
+
+
+def _betabinom_difference_pmf(m, alpha_a, beta_a, alpha_b, beta_b):
+    # Probability mass of the difference of two independent beta-binomial variables, b - a,
+    # over the support -m..m, via convolution of the two mass functions
+    pmf_a = _betabinom_pmf(m, alpha_a, beta_a)
+    pmf_b = _betabinom_pmf(m, alpha_b, beta_b)
+    pmf_d = np.clip(scipy.signal.fftconvolve(pmf_b, pmf_a[::-1]), 0, None)
+    return pmf_d / np.sum(pmf_d)
+
+
+def _discrete_quantiles(support, pmf, quantiles):
+    # Quantiles of a discrete distribution, the smallest value whose CDF is >= each quantile
+    cdf = np.cumsum(pmf)
+    idx = np.searchsorted(cdf / cdf[-1], quantiles, side="left")
+    return support[np.clip(idx, 0, len(support) - 1)]
+
+
+def _empirical_quantiles(draws, quantiles):
+    # Quantiles of the rows of draws using the inverse of the empirical CDF, matching
+    # _discrete_quantiles for integer valued draws
+    n = draws.shape[-1]
+    idx = np.clip(np.ceil(np.asarray(quantiles) * n).astype(int) - 1, 0, n - 1)
+    return np.take(np.partition(draws, np.unique(idx), axis=-1), idx, axis=-1)
+
+
+def _beta_difference_cdf(d, alpha_a, beta_a, alpha_b, beta_b, metric="difference"):
+    # P(theta_b - theta_a <= d) (or P(metric <= d)) for independent Beta variables, by 1-D quadrature
+    # over the quantiles of theta_a, i.e. the integral of F_b(F_a^-1(u) + d) for u in [0, 1]
+    g = _metric_null(metric, d)[0]
+    return scipy.integrate.quad(
+        lambda u: scipy.special.betainc(
+            alpha_b,
+            beta_b,
+            np.clip(g(scipy.special.betaincinv(alpha_a, beta_a, u)), 0, 1),
+        ),
+        0,
+        1,
+        limit=200,
+    )[0]
+
+
+def _beta_difference_sf(d, alpha_a, beta_a, alpha_b, beta_b, nodes=64):
+    # P(theta_b - theta_a > d) for arrays of independent Beta variables, vectorised with a fixed
+    # Gauss-Legendre rule over the quantiles of theta_a, i.e. 1 - the integral of F_b(F_a^-1(u) + d)
+    x, w = np.polynomial.legendre.leggauss(nodes)
+    u = (x + 1) / 2
+    q = scipy.special.betaincinv(
+        np.asarray(alpha_a)[..., None], np.asarray(beta_a)[..., None], u
+    )
+    f = scipy.special.betainc(
+        np.asarray(alpha_b)[..., None],
+        np.asarray(beta_b)[..., None],
+        np.clip(q + d, 0, 1),
+    )
+    return 1 - f @ (w / 2)
+
+
+def _beta_binomial_null_bayes_factor(a, b, alpha, beta, value=0, metric="difference"):
+    # Bayes factor of H1: theta_a, theta_b independent ~ Beta(alpha, beta) versus H0: theta_b = theta_a + value
+    # (or the metric equals value), theta_a ~ Beta(alpha, beta) restricted to where theta_b is in [0, 1].
+    # Closed form for value = 0, otherwise the H0 marginal likelihood is one quadrature of its integrand
+    # scaled by its maximum in log space, so it tends to the closed form as value tends to 0 for any prior
+    s_a, f_a = a[0], a[1] - a[0]
+    s_b, f_b = b[0], b[1] - b[0]
+    log_m1 = (
+        scipy.special.betaln(s_a + alpha, f_a + beta)
+        + scipy.special.betaln(s_b + alpha, f_b + beta)
+        - 2 * scipy.special.betaln(alpha, beta)
+    )
+    if value == 0:
+        log_m0 = scipy.special.betaln(s_a + s_b + alpha, f_a + f_b + beta)
+    else:
+        g, lower, upper = _metric_null(metric, value)
+
+        def log_f(x, p_lower=0, p_upper=0):
+            # Log of the H0 integrand, less the powers p_lower of x and p_upper of 1 - x
+            return (
+                scipy.special.xlogy(s_a + alpha - 1 - p_lower, x)
+                + scipy.special.xlog1py(f_a + beta - 1 - p_upper, -x)
+                + scipy.special.xlogy(s_b, g(x))
+                + scipy.special.xlog1py(f_b, -g(x))
+            )
+
+        def segment(x_lower, x_upper):
+            # Integral of the scaled integrand between two breaks, to a relative tolerance as the scaled
+            # integrand can be tiny.  A power of x (or 1 - x) singular at 0 (or 1), e.g. the Jeffreys
+            # prior with no data, is integrated exactly as the algebraic weight of quad
+            p_lower = s_a + alpha - 1 if x_lower == 0 and s_a + alpha < 1 else 0
+            p_upper = f_a + beta - 1 if x_upper == 1 and f_a + beta < 1 else 0
+            if p_lower == 0 and p_upper == 0:
+                return scipy.integrate.quad(
+                    lambda x: np.exp(log_f(x) - scale),
+                    x_lower,
+                    x_upper,
+                    epsabs=0,
+                    epsrel=1e-10,
+                    limit=200,
+                )[0]
+            return scipy.integrate.quad(
+                lambda x: np.exp(log_f(x, p_lower, p_upper) - scale),
+                x_lower,
+                x_upper,
+                weight="alg",
+                wvar=(p_lower, p_upper),
+                epsabs=0,
+                epsrel=1e-10,
+                limit=200,
+            )[0]
+
+        with np.errstate(invalid="ignore"):
+            # log_f is -inf everywhere when the likelihood of H0 underflows, e.g. an extreme log odds ratio
+            mode = scipy.optimize.minimize_scalar(
+                lambda x: -log_f(x),
+                bounds=(lower, upper),
+                method="bounded",
+                options={"xatol": 1e-12},
+            ).x
+        scale = log_f(mode)
+        if not np.isfinite(scale):
+            # H0 has zero likelihood, which is reported as decisive evidence against it
+            return np.inf
+        # Split at the mode and at multiples of the approximate posterior sd about it so that peaked
+        # likelihoods are not missed
+        sd = np.sqrt(mode * (1 - mode) / (a[1] + b[1] + alpha + beta))
+        breaks = mode + sd * np.array([-64, -16, -4, -1, 0, 1, 4, 16, 64])
+        breaks = np.unique(np.clip(np.append(breaks, [lower, upper]), lower, upper))
+        integral = sum(
+            segment(breaks[i], breaks[i + 1]) for i in range(0, len(breaks) - 1)
+        )
+        mass = scipy.special.betainc(alpha, beta, upper) - scipy.special.betainc(
+            alpha, beta, lower
+        )
+        if not integral > 0:
+            # H0 has zero likelihood, as above
+            return np.inf
+        log_m0 = scale + np.log(integral) - np.log(mass)
+    with np.errstate(over="ignore"):
+        # Overflows to inf only beyond 1e308, which is reported as decisive
+        return np.exp(log_m1 - log_m0 + scipy.special.betaln(alpha, beta))
+
+
+def _sorted_hdi(sorted_draws, interval):
+    # HDI of each row of sorted draws, the narrowest interval containing the interval proportion
+    # of the draws (the same estimator as az.hdi, vectorised over rows)
+    n = sorted_draws.shape[-1]
+    k = int(np.floor(interval * n))
+    widths = sorted_draws[..., k:] - sorted_draws[..., : n - k]
+    idx = np.argmin(widths, axis=-1)[..., None]
+    lower = np.take_along_axis(sorted_draws, idx, axis=-1)[..., 0]
+    upper = np.take_along_axis(sorted_draws, idx + k, axis=-1)[..., 0]
+    return lower, upper
+
+
+def _rope_probabilities(sorted_draws, value, widths):
+    # Proportions of each row of sorted draws left of, inside and right of value +/- each width,
+    # from a binary search of each row, returning arrays of shape [rows, widths]
+    rows, n = sorted_draws.shape
+    widths = np.asarray(widths, dtype=float)
+    left = np.empty((rows, len(widths)))
+    right = np.empty((rows, len(widths)))
+    for i in range(0, rows):
+        left[i] = np.searchsorted(sorted_draws[i], value - widths, side="left")
+        right[i] = n - np.searchsorted(sorted_draws[i], value + widths, side="right")
+    left /= n
+    right /= n
+    return left, 1 - left - right, right
+
+
+def _rope_decision(hdi_lower, hdi_upper, value, widths):
+    # HDI + ROPE decision rule, 'reject null' if the HDI is entirely outside the ROPE,
+    # 'accept null' if it is entirely inside and 'undecided' otherwise, shape [rows, widths]
+    hdi_lower = np.asarray(hdi_lower)[..., None]
+    hdi_upper = np.asarray(hdi_upper)[..., None]
+    widths = np.asarray(widths, dtype=float)
+    outside = (hdi_lower > value + widths) | (hdi_upper < value - widths)
+    inside = (hdi_lower >= value - widths) & (hdi_upper <= value + widths)
+    return np.where(
+        outside, "reject null", np.where(inside, "accept null", "undecided")
+    )
+
+
+# Derived metrics comparing b with a, and their default parameter names
+_METRICS = {
+    "difference": "delta",
+    "relative lift": "lift",
+    "log odds ratio": "log_odds_ratio",
+}
+
+
+def _calculate_metric(a_draw, b_draw, metric, out=None):
+    # Derives a metric comparing the draws of b with those of a, writing into out if it is given,
+    # with at most one further temporary array of the same size
+    if out is None:
+        out = np.empty_like(a_draw)
+    if metric == "difference":
+        np.subtract(b_draw, a_draw, out=out)
+    elif metric == "relative lift":
+        np.divide(b_draw, a_draw, out=out)
+        np.subtract(out, 1, out=out)
+    elif metric == "log odds ratio":
+        # log(b) - log(1 - b) - log(a) + log(1 - a)
+        tmp = np.empty_like(a_draw)
+        np.log(b_draw, out=out)
+        np.negative(b_draw, out=tmp)
+        np.log1p(tmp, out=tmp)
+        np.subtract(out, tmp, out=out)
+        np.log(a_draw, out=tmp)
+        np.subtract(out, tmp, out=out)
+        np.negative(a_draw, out=tmp)
+        np.log1p(tmp, out=tmp)
+        np.add(out, tmp, out=out)
+    else:
+        raise ValueError("metric must be one of " + str(list(_METRICS)))
+    return out
+
+
+def _export_draws(a_draw, b_draw, metric_draws, names, metrics):
+    # Selects the draws of a, b and of each metric to export, and checks their names
+    if metrics is None:
+        metrics = list(metric_draws)
+    if any(i not in metric_draws for i in metrics):
+        raise ValueError(
+            "metrics must be a list of the metrics set at initialisation "
+            + str(list(metric_draws))
+        )
+    if names is None:
+        names = ["theta_a", "theta_b"] + [_METRICS[i] for i in metrics]
+    if len(names) != 2 + len(metrics) or len(set(names)) != len(names):
+        raise ValueError("names must be a list of 2 + len(metrics) distinct names")
+    return [a_draw, b_draw] + [metric_draws[i] for i in metrics], names
+
+
+def _draws_dataset(draws, names, attrs, experiments=None):
+    # Wraps draws of shape [n] (or [experiments, n]) in an xr.Dataset with dims (chain, draw)
+    # (or (chain, draw, experiment)), holding views of the draws rather than copies
+    dims = ("chain", "draw")
+    coords = {"chain": [0], "draw": np.arange(0, draws[0].shape[-1])}
+    if experiments is not None:
+        dims = dims + ("experiment",)
+        coords.update(experiments)
+    return xr.Dataset(
+        {k: (dims, d.T[None]) for k, d in zip(names, draws)},
+        coords=coords,
+        attrs=attrs,
+    )
+
+
+def _metric_null(metric, value):
+    # theta_b as a function of theta_a when the metric equals value, and the range of theta_a for
+    # which it is in [0, 1]
+    if metric == "difference":
+        return (lambda x: x + value), max(0, -value), min(1, 1 - value)
+    elif metric == "relative lift":
+        return (lambda x: x * (1 + value)), 0, min(1, 1 / (1 + value))
+    elif metric == "log odds ratio":
+        return (
+            lambda x: scipy.special.expit(scipy.special.logit(x) + value),
+            0,
+            1,
+        )
+    raise ValueError("metric must be one of " + str(list(_METRICS)))
+
+
+def _spawn_rng(seed, key):
+    # Random generator independent of the posterior draws, reproducible for a given seed and key
+    # and never touching the global NumPy random state
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(key,)))
+
+
+def _is_seed(seed):
+    # Whether seed is None or a non-negative integer accepted by np.random.RandomState
+    if seed is None:
+        return True
+    return (
+        isinstance(seed, (int, np.integer)) and not isinstance(seed, bool) and seed >= 0
+    )
+
+
+def _make_read_only(*arrays):
+    # Marks arrays as read-only so that draws shared between threads cannot be modified in place
+    for i in arrays:
+        i.flags.writeable = False
+
+
+# Checks applied to every row of counts, in the order they are reported
+_COUNT_CHECKS = ["missing", "negative", "successes_exceed_trials"]
+
+
+def _invalid_counts(a, b):
+    # Boolean masks [checks, experiments] of the rows of [[successes, trials], ...] failing each check,
+    # evaluated for all rows at once
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    masks = np.empty((len(_COUNT_CHECKS), a.shape[0]), dtype=bool)
+    masks[0] = ~(np.isfinite(a).all(axis=1) & np.isfinite(b).all(axis=1))
+    masks[1] = (a < 0).any(axis=1) | (b < 0).any(axis=1)
+    masks[2] = (a[:, 0] > a[:, 1]) | (b[:, 0] > b[:, 1])
+    return masks
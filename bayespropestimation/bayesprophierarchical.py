@@ -0,0 +1,129 @@
+import warnings
+
+import numpy as np
+import scipy.optimize
+import scipy.special
+
+from bayespropestimation.bayespropbatch import BayesProportionsBatchEstimation
+
+
+def _beta_binomial_log_marginal_likelihood(log_params, successes, trials):
+    # Log marginal likelihood (up to the binomial coefficients) of the counts under a Beta prior
+    # with parameters exp(log_params), and its gradient with respect to log_params
+    alpha, beta = np.exp(log_params)
+    failures = trials - successes
+    ll = np.sum(
+        scipy.special.betaln(successes + alpha, failures + beta)
+        - scipy.special.betaln(alpha, beta)
+    )
+    psi_total = scipy.special.digamma(trials + alpha + beta) - scipy.special.digamma(
+        alpha + beta
+    )
+    d_alpha = np.sum(
+        scipy.special.digamma(successes + alpha)
+        - scipy.special.digamma(alpha)
+        - psi_total
+    )
+    d_beta = np.sum(
+        scipy.special.digamma(failures + beta) - scipy.special.digamma(beta) - psi_total
+    )
+    return ll, np.array([d_alpha * alpha, d_beta * beta])
+
+
+def _fit_beta_binomial_prior(successes, trials, start):
+    # Empirical Bayes estimate of the Beta prior, maximising the beta-binomial marginal likelihood
+    result = scipy.optimize.minimize(
+        lambda x: tuple(
+            -i for i in _beta_binomial_log_marginal_likelihood(x, successes, trials)
+        ),
+        np.log(start),
+        jac=True,
+        method="L-BFGS-B",
+        bounds=[(-10, 15), (-10, 15)],
+    )
+    alpha, beta = np.exp(result.x)
+    # Homogeneous or few groups have their maximum at a bound, i.e. (near) complete pooling, and the
+    # likelihood is so flat approaching it that the optimiser may stop within a log unit of the bound
+    converged = bool(result.success) and bool(np.all((result.x > -9) & (result.x < 14)))
+    return alpha, beta, -result.fun, converged
+
+
+class BayesHierarchicalProportionsEstimation(BayesProportionsBatchEstimation):
+    def __init__(
+        self,
+        a,
+        b,
+        prior_alpha=1,
+        prior_beta=1,
+        n=10000,
+        seed=None,
+        labels=None,
+        metrics=["difference"],
+        invalid="raise",
+    ):
+        """
+        Initialises the BayesHierarchicalProportionsEstimation class, which estimates the same A/B comparison
+        across many segments with partial pooling.  A Beta prior for sample a and one for sample b are each
+        learnt from all segments by empirical Bayes (maximising the beta-binomial marginal likelihood),
+        then the posteriors of every segment are sampled in batch, so small segments are shrunk towards
+        the overall rate of their sample and the treatment effect is preserved.
+        Parameters
+        ----------
+        a: list, ndarray or DataFrame [[successes, trials], ...]:  array describing results from sample a, one row per segment
+        b: list, ndarray or DataFrame [[successes, trials], ...]:  array describing results from sample b, one row per segment
+        prior_alpha: float, starting value of the alpha parameter of the Beta prior for the fit, default = 1
+        prior_beta: float, starting value of the beta parameter of the Beta prior for the fit, default = 1
+        n: integer, number of samples to take from each posterior distribution, default = 10000
+        seed: integer, set random seed at the start of the initialisation, default = None
+        labels: list, label for each segment.  Default None (0, 1, 2, ...)
+        metrics: list, metrics comparing b with a derived from the draws, see BayesProportionsEstimation.
+            Default ['difference']
+        invalid: str, handling of invalid segments, see BayesProportionsBatchEstimation.  Default 'raise'
+        Attributes
+        ----------
+        prior_alpha: np.ndarray[2], fitted alpha parameters of the Beta priors of a and b
+        prior_beta: np.ndarray[2], fitted beta parameters of the Beta priors of a and b
+        log_marginal_likelihood: float, log marginal likelihood of the fitted priors (up to a constant)
+        prior_converged: np.ndarray[2], False for a sample whose fit did not converge or stopped at or
+            near a bound of log alpha or log beta ([-10, 15]), e.g. with few or homogeneous segments,
+            which (nearly) completely pools its segments.  A RuntimeWarning is raised in that case
+        """
+        super().__init__(
+            a,
+            b,
+            prior_alpha=prior_alpha,
+            prior_beta=prior_beta,
+            n=n,
+            seed=seed,
+            labels=labels,
+            metrics=metrics,
+            invalid=invalid,
+        )
+
+    def _prior(self, arm):
+        # Fitted Beta prior of sample a (arm 0) or b (arm 1)
+        return self.prior_alpha[arm], self.prior_beta[arm]
+
+    def _sample_posteriors(self):
+        # Fits the prior of each sample to its valid segments before drawing from the posteriors
+        fits = [
+            _fit_beta_binomial_prior(
+                d[self._valid, 0],
+                d[self._valid, 1],
+                [self.prior_alpha, self.prior_beta],
+            )
+            for d in (self.a, self.b)
+        ]
+        self.prior_alpha = np.array([i[0] for i in fits])
+        self.prior_beta = np.array([i[1] for i in fits])
+        self.log_marginal_likelihood = sum(i[2] for i in fits)
+        self.prior_converged = np.array([i[3] for i in fits])
+        if not self.prior_converged.all():
+            warnings.warn(
+                "the fit of the prior of "
+                + " and ".join(np.array(["a", "b"])[~self.prior_converged])
+                + " did not converge or stopped at or near a bound, so the segments are"
+                + " (nearly) completely pooled",
+                RuntimeWarning,
+            )
+        super()._sample_posteriors()
@@ -0,0 +1,237 @@
+import concurrent.futures
+
+import numpy as np
+import scipy.stats
+
+from bayespropestimation.bayesprophelpers import (
+    _beta_difference_sf,
+    _is_seed,
+    _probability_mcse,
+)
+from bayespropestimation.bayespropsummary import PosteriorSummary
+
+
+def _power_at(args):
+    # Power at one number of trials, at module level so that it can be sent to worker processes
+    analysis, trials = args
+    return analysis.power(trials)
+
+
+class BayesProportionsPowerAnalysis:
+    def __init__(
+        self,
+        rate_a,
+        rate_b,
+        prior_alpha=0.5,
+        prior_beta=0.5,
+        direction="greater than",
+        value=0,
+        threshold=0.95,
+        simulations=2000,
+        seed=None,
+        nodes=64,
+    ):
+        """
+        Initialises the BayesProportionsPowerAnalysis class, which plans the number of trials of an experiment
+        before it is run.  Datasets are simulated from assumed true rates, each is analysed as
+        BayesProportionsEstimation would, and the power (or assurance) is the proportion of datasets for which
+        the decision rule, probability that b > (a + value) (or b < (a + value)) > threshold, is met.
+        The probabilities are calculated for all datasets at once by quadrature rather than by sampling, and
+        every number of trials is evaluated with the same random numbers, so the power curve is smooth.
+        Parameters
+        ----------
+        rate_a: float or list, assumed true rate of a.  A list of draws (e.g. from a design prior or an earlier
+            posterior) gives the assurance, each simulation taking a rate at random from it
+        rate_b: float or list, assumed true rate of b, as rate_a
+        prior_alpha: float, alpha parameter for the Beta prior distribution, default = 0.5 (Jeffreys prior)
+        prior_beta: float, beta parameter for the Beta prior distribution, default = 0.5 (Jeffreys prior)
+        direction: str, defines the direction of the inference, options 'greater than' or 'less than'.  Default is 'greater than'.
+        value: float,  defines the value about which to make the inference.  Default = 0.
+        threshold: float, probability the inference must exceed for the decision rule to be met.  Default = 0.95
+        simulations: integer, number of simulated datasets per number of trials, default = 2000
+        seed: integer, set random seed at the start of the initialisation, default = None
+        nodes: integer, number of Gauss-Legendre nodes of the quadrature, default = 64
+        """
+        self.rate_a = np.atleast_1d(np.asarray(rate_a, dtype=float))
+        self.rate_b = np.atleast_1d(np.asarray(rate_b, dtype=float))
+        self.prior_alpha = prior_alpha
+        self.prior_beta = prior_beta
+        self.direction = direction
+        self.value = value
+        self.threshold = threshold
+        self.simulations = simulations
+        self.seed = seed
+        self.nodes = nodes
+        self._check_inputs()
+        self._simulate_uniforms()
+
+    def _check_inputs(self):
+        # Checks that parameters are in the correct format
+        for rate in [self.rate_a, self.rate_b]:
+            if (
+                rate.ndim != 1
+                or len(rate) == 0
+                or np.any(~(rate >= 0))
+                or np.any(~(rate <= 1))
+            ):
+                raise ValueError(
+                    "rate_a and rate_b must be floats or lists of floats >= 0 and <= 1"
+                )
+        if (self.prior_alpha <= 0) or (self.prior_beta <= 0):
+            raise ValueError("the prior_alpha and/or prior_beta parameters must be > 0")
+        if self.direction not in ["greater than", "less than"]:
+            raise ValueError("direction must be 'greater than' or 'less than'")
+        if self.threshold is None or self.threshold <= 0 or self.threshold >= 1:
+            raise ValueError("threshold must be a float > 0 and < 1")
+        if self.simulations <= 0:
+            raise ValueError("simulations must be a positive integer")
+        if not _is_seed(self.seed):
+            raise ValueError("seed must be a positive integer or None")
+        if self.nodes <= 0:
+            raise ValueError("nodes must be a positive integer")
+
+    def _simulate_uniforms(self):
+        # Draws the random numbers of every simulated dataset once, so that every number of trials
+        # is evaluated with common random numbers
+        random_state = np.random.RandomState(self.seed)
+        self._p_a = self.rate_a[
+            random_state.randint(0, len(self.rate_a), self.simulations)
+        ]
+        self._p_b = self.rate_b[
+            random_state.randint(0, len(self.rate_b), self.simulations)
+        ]
+        self._u_a = random_state.random_sample(self.simulations)
+        self._u_b = random_state.random_sample(self.simulations)
+
+    def _simulate_counts(self, trials):
+        # Successes of a and b in each simulated dataset, by inverting the binomial distribution so that
+        # the successes of each simulation grow with the number of trials
+        s_a = scipy.stats.binom.ppf(self._u_a, trials, self._p_a)
+        s_b = scipy.stats.binom.ppf(self._u_b, trials, self._p_b)
+        return np.clip(s_a, 0, trials), np.clip(s_b, 0, trials)
+
+    def power(self, trials):
+        """
+        Estimates the power (or assurance) for a number of trials
+        Parameters
+        ----------
+        trials: integer, number of trials in each of a and b
+        Returns
+        -------
+        float, proportion of simulated datasets for which the decision rule is met
+        """
+        if trials <= 0:
+            raise ValueError("trials must be a positive integer")
+        s_a, s_b = self._simulate_counts(trials)
+        # Datasets with the same counts have the same posterior, so each distinct pair is evaluated once
+        keys, inverse = np.unique(
+            s_a.astype(np.int64) * (trials + 1) + s_b.astype(np.int64),
+            return_inverse=True,
+        )
+        s_a, s_b = np.divmod(keys, trials + 1)
+        p = _beta_difference_sf(
+            self.value,
+            s_a + self.prior_alpha,
+            trials - s_a + self.prior_beta,
+            s_b + self.prior_alpha,
+            trials - s_b + self.prior_beta,
+            self.nodes,
+        )
+        if self.direction == "less than":
+            p = 1 - p
+        return np.mean((p > self.threshold)[inverse.ravel()])
+
+    def _map_power(self, trials, executor):
+        # Power at several numbers of trials, across worker processes if an executor is given
+        if executor is None or len(trials) == 1:
+            return [self.power(i) for i in trials]
+        return list(executor.map(_power_at, [(self, i) for i in trials]))
+
+    def power_curve(self, trials, n_jobs=1, as_frame=True):
+        """
+        Estimates the power (or assurance) for each of several numbers of trials
+        Parameters
+        ----------
+        trials: list, numbers of trials in each of a and b
+        n_jobs: integer, number of worker processes.  Default 1
+        as_frame:  boolean, returns a pd.DataFrame if True, otherwise a lightweight PosteriorSummary.  Default True
+        Returns
+        -------
+        pd.DataFrame (or PosteriorSummary if as_frame is False), one row per number of trials:
+            'power':  proportion of simulated datasets for which the decision rule is met
+            'power_mcse':  Monte Carlo standard error of the power
+            'trials':  number of trials in each of a and b
+        """
+        if trials is None or len(trials) == 0:
+            raise ValueError("trials must be a list of positive integers of length > 0")
+        if n_jobs <= 0:
+            raise ValueError("n_jobs must be a positive integer")
+        if n_jobs > 1:
+            with concurrent.futures.ProcessPoolExecutor(n_jobs) as executor:
+                power = self._map_power(trials, executor)
+        else:
+            power = self._map_power(trials, None)
+        power = np.asarray(power)
+        summary = PosteriorSummary(
+            np.column_stack([power, _probability_mcse(power, self.simulations)]),
+            ["power", "power_mcse"],
+            {"trials": np.asarray(trials)},
+        )
+        if as_frame is True:
+            return summary.to_frame()
+        return summary
+
+    def _search_sample_size(self, target, start, max_trials, n_jobs, executor):
+        # Exponential search for a number of trials reaching the target, then bisection between it and the
+        # last number of trials short of the target, evaluating n_jobs numbers of trials per round
+        low, high = 0, None
+        size = start
+        while high is None:
+            if low >= max_trials:
+                raise ValueError(
+                    "the target power is not reached with max_trials trials"
+                )
+            sizes = sorted({min(size * 2**i, max_trials) for i in range(n_jobs)})
+            for s, p in zip(sizes, self._map_power(sizes, executor)):
+                if p >= target:
+                    high = s
+                    break
+                low = s
+            size = sizes[-1] * 2
+        while high - low > 1:
+            sizes = np.linspace(low, high, n_jobs + 2).round().astype(int)
+            sizes = sorted({int(i) for i in sizes if low < i < high})
+            for s, p in zip(sizes, self._map_power(sizes, executor)):
+                if p >= target:
+                    high = s
+                    break
+                low = s
+        return high
+
+    def find_sample_size(self, target=0.8, start=10, max_trials=10**7, n_jobs=1):
+        """
+        Finds the smallest number of trials in each of a and b for which the power (or assurance) reaches a
+        target, by exponential search followed by bisection.  With common random numbers the power curve is
+        close to, but not exactly, monotonic, so the result is the first crossing of the target found.
+        Parameters
+        ----------
+        target: float, power to reach.  Default = 0.8
+        start: integer, first number of trials to evaluate.  Default = 10
+        max_trials: integer, largest number of trials to evaluate.  Default = 10000000
+        n_jobs: integer, number of worker processes, each evaluating one number of trials per round.  Default 1
+        Returns
+        -------
+        integer, number of trials in each of a and b
+        """
+        if target is None or target <= 0 or target >= 1:
+            raise ValueError("target must be a float > 0 and < 1")
+        if start <= 0 or max_trials < start:
+            raise ValueError("start must be a positive integer <= max_trials")
+        if n_jobs <= 0:
+            raise ValueError("n_jobs must be a positive integer")
+        if n_jobs > 1:
+            with concurrent.futures.ProcessPoolExecutor(n_jobs) as executor:
+                return self._search_sample_size(
+                    target, start, max_trials, n_jobs, executor
+                )
+        return self._search_sample_size(target, start, max_trials, n_jobs, None)
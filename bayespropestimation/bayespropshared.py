@@ -0,0 +1,119 @@
+import numpy as np
+
+from bayespropestimation.bayesprophelpers import _make_read_only
+
+# Attributes of an estimator that hold draws, or are not needed once it is sampled
+_DRAW_ATTRIBUTES = ["a_draw", "b_draw", "d_draw", "metric_draws", "_random_state"]
+
+
+class SharedPosteriorHandle:
+    """
+    Picklable handle to the draws of an estimator copied into shared memory (multiprocessing.shared_memory)
+    or a memory-mapped file.  The handle is cheap to send to worker processes, where attach() rebuilds
+    the estimator on top of the shared draws without copying them.  Created by share_draws().
+    The process that created the handle owns the shared memory and should call unlink() (or use the
+    handle as a context manager) once the workers are finished.
+    Attributes
+    ----------
+    name: str, name of the shared memory block, or path of the memory-mapped file
+    backend: str, 'shared_memory' or 'memmap'
+    shape: tuple, shape of the buffer [draw arrays, *draw shape]
+    dtype: str, dtype of the draws
+    metrics: list, metrics held in the buffer after the draws of a and b
+    """
+
+    def __init__(self, est, path=None):
+        draws = [est.a_draw, est.b_draw] + list(est.metric_draws.values())
+        self.cls = type(est)
+        self.params = {k: v for k, v in vars(est).items() if k not in _DRAW_ATTRIBUTES}
+        self.metrics = list(est.metric_draws)
+        self.shape = (len(draws),) + est.a_draw.shape
+        self.dtype = est.a_draw.dtype.str
+        self._shm = None
+        if path is None:
+            from multiprocessing import shared_memory
+
+            nbytes = int(np.prod(self.shape)) * est.a_draw.dtype.itemsize
+            self._shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+            self.backend = "shared_memory"
+            self.name = self._shm.name
+            buffer = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+        else:
+            self.backend = "memmap"
+            self.name = path
+            buffer = np.memmap(path, dtype=self.dtype, mode="w+", shape=self.shape)
+        for i, d in enumerate(draws):
+            buffer[i] = d
+        if self.backend == "memmap":
+            buffer.flush()
+        del buffer
+        self._owner = True
+
+    def __getstate__(self):
+        # Only the description of the buffer is sent to other processes, never the draws
+        state = self.__dict__.copy()
+        state["_shm"] = None
+        state["_owner"] = False
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        if self._owner:
+            self.unlink()
+
+    def _buffer(self):
+        # Maps the shared draws into this process, read-only and without copying
+        if self.backend == "shared_memory":
+            if self._shm is None:
+                from multiprocessing import shared_memory
+
+                self._shm = shared_memory.SharedMemory(name=self.name)
+            buffer = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+        else:
+            buffer = np.memmap(self.name, dtype=self.dtype, mode="r", shape=self.shape)
+        _make_read_only(buffer)
+        return buffer
+
+    def attach(self):
+        """
+        Rebuilds the estimator on top of the shared draws, without copying or resampling them
+        Returns
+        -------
+        BayesProportionsEstimation or BayesProportionsBatchEstimation, with the same parameters and draws
+        as the estimator the handle was created from
+        """
+        buffer = self._buffer()
+        est = self.cls.__new__(self.cls)
+        vars(est).update(self.params)
+        est.a_draw = buffer[0]
+        est.b_draw = buffer[1]
+        est.metric_draws = {k: buffer[i + 2] for i, k in enumerate(self.metrics)}
+        est.d_draw = est.metric_draws["difference"]
+        return est
+
+    def close(self):
+        """
+        Closes the mapping of the shared memory in this process.  Estimators attached in this process
+        must not be used afterwards.
+        """
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+    def unlink(self):
+        """
+        Frees the shared memory (or deletes the memory-mapped file), called once by the owning process
+        after every worker has finished with it
+        """
+        if self.backend == "shared_memory":
+            from multiprocessing import shared_memory
+
+            shm = self._shm or shared_memory.SharedMemory(name=self.name)
+            shm.unlink()
+        else:
+            import os
+
+            os.remove(self.name)
@@ -0,0 +1,61 @@
+import pandas as pd
+
+
+class PosteriorSummary:
+    """
+    Lightweight columnar summary of posterior draws, returned by the summary methods when
+    as_frame=False.  Holds a single float array rather than building a pd.DataFrame.
+    Attributes
+    ----------
+    values: np.ndarray[rows, columns], summary values
+    columns: list of str, names of the columns of values, e.g. ['0.025', '0.5', '0.975', 'mean']
+    index: dict of str: np.ndarray[rows], labels for each row, e.g. {'parameter': ['theta_a', 'theta_b', 'delta']}
+    """
+
+    __slots__ = ("values", "columns", "index")
+
+    def __init__(self, values, columns, index):
+        self.values = values
+        self.columns = columns
+        self.index = index
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def __getitem__(self, key):
+        # Returns a column of values or of row labels by name
+        if key in self.index:
+            return self.index[key]
+        return self.values[:, self.columns.index(key)]
+
+    def __repr__(self):
+        return "PosteriorSummary(columns=%r, index=%r, rows=%d)" % (
+            self.columns,
+            list(self.index),
+            len(self),
+        )
+
+    def copy(self):
+        """
+        Copies the summary, so that changes to the copy do not affect the original
+        Returns
+        -------
+        PosteriorSummary:  with copies of values, columns and index
+        """
+        return PosteriorSummary(
+            self.values.copy(),
+            list(self.columns),
+            {k: v.copy() for k, v in self.index.items()},
+        )
+
+    def to_frame(self):
+        """
+        Converts the summary to a pd.DataFrame
+        Returns
+        -------
+        pd.DataFrame:  one column per entry of columns followed by one column per entry of index
+        """
+        df = pd.DataFrame(self.values, columns=self.columns)
+        for k, v in self.index.items():
+            df[k] = v
+        return df
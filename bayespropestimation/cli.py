@@ -0,0 +1,223 @@
+"""Console script for batch scoring of experiments with bayespropestimation."""
+import argparse
+import multiprocessing
+import sys
+import time
+
+import pandas as pd
+
+from bayespropestimation.bayespropbatch import BayesProportionsBatchEstimation
+
+
+def _is_parquet(path):
+    # Whether a path is treated as a parquet file rather than a csv file
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def _import_pyarrow():
+    # pyarrow is an optional dependency, only needed to read and write parquet files
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is required to read and write parquet files")
+    return pyarrow
+
+
+def _read_chunks(path, chunksize):
+    # Streams the input file in chunks of rows
+    if _is_parquet(path):
+        pyarrow = _import_pyarrow()
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(
+            batch_size=chunksize
+        ):
+            yield batch.to_pandas()
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            yield chunk
+
+
+def _score_chunk(args):
+    # Estimates the posteriors for a chunk of experiments and appends the summaries to it
+    chunk, seed, options = args
+    a_s, a_t, b_s, b_t = options["columns"]
+    est = BayesProportionsBatchEstimation(
+        chunk[[a_s, a_t]].to_numpy(),
+        chunk[[b_s, b_t]].to_numpy(),
+        prior_alpha=options["prior_alpha"],
+        prior_beta=options["prior_beta"],
+        n=options["n"],
+        seed=seed,
+        invalid=options["invalid"],
+    )
+    if options["invalid"] == "skip":
+        chunk = chunk[~est.invalid_rows]
+    summary = est.quantile_summary(quantiles=options["quantiles"], as_frame=False)
+    names = ["theta_a", "theta_b", "delta"]
+    # Explicit width so that a chunk left empty by skipping invalid rows keeps the output columns
+    values = summary.values.reshape(len(chunk), len(names) * len(summary.columns))
+    col_names = [i + "_" + j for i in names for j in summary.columns]
+    result = chunk.reset_index(drop=True)
+    result = pd.concat([result, pd.DataFrame(values, columns=col_names)], axis=1)
+    result["prob_delta_greater_than_0"] = est.infer_delta_probability()
+    if options["invalid"] == "flag":
+        result["invalid"] = est.invalid_rows
+    return result
+
+
+class _ChunkWriter:
+    # Writes scored chunks to a csv or parquet file as they are produced.  Parquet chunks must share
+    # the schema of the first chunk, so the count columns (integers in one chunk, floats in another if
+    # a count is missing) are always written as floats and other columns are cast to the first schema
+    def __init__(self, path, float_columns=()):
+        self.path = path
+        self.float_columns = list(float_columns)
+        self.writer = None
+        self.first = True
+
+    def write(self, df):
+        if _is_parquet(self.path):
+            pyarrow = _import_pyarrow()
+            df = df.astype({i: float for i in self.float_columns})
+            table = pyarrow.Table.from_pandas(df, preserve_index=False)
+            if self.writer is None:
+                self.writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+        else:
+            df.to_csv(
+                self.path,
+                mode="w" if self.first else "a",
+                header=self.first,
+                index=False,
+            )
+        self.first = False
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _make_parser():
+    # Defines the command line arguments
+    parser = argparse.ArgumentParser(
+        prog="bayesprop",
+        description="Bayesian estimation and comparison of proportions",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    score = subparsers.add_parser(
+        "score",
+        help="estimate the posteriors of every experiment (row) in a csv or parquet file",
+    )
+    score.add_argument(
+        "input", help="input csv or parquet file, one experiment per row"
+    )
+    score.add_argument(
+        "-o", "--output", required=True, help="output csv or parquet file"
+    )
+    score.add_argument(
+        "--columns",
+        nargs=4,
+        default=["a_successes", "a_trials", "b_successes", "b_trials"],
+        metavar=("A_SUCCESSES", "A_TRIALS", "B_SUCCESSES", "B_TRIALS"),
+        help="input columns holding the successes and trials of a and b",
+    )
+    score.add_argument("--prior-alpha", type=float, default=0.5)
+    score.add_argument("--prior-beta", type=float, default=0.5)
+    score.add_argument(
+        "-n", type=int, default=10000, help="number of draws per posterior"
+    )
+    score.add_argument(
+        "--quantiles", type=float, nargs="+", default=[0.025, 0.5, 0.975]
+    )
+    score.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="random seed, chunk i is sampled with seed + i",
+    )
+    score.add_argument(
+        "--invalid",
+        choices=["raise", "skip", "flag"],
+        default="raise",
+        help="stop at, drop or flag rows with missing or negative counts or successes exceeding trials",
+    )
+    score.add_argument(
+        "--chunksize", type=int, default=100, help="number of rows per chunk"
+    )
+    score.add_argument(
+        "-j", "--jobs", type=int, default=1, help="number of worker processes"
+    )
+    score.add_argument(
+        "-q", "--quiet", action="store_true", help="do not report progress"
+    )
+    return parser
+
+
+def score(args):
+    """
+    Scores every experiment of the input file in chunks, writing each chunk to the output file as soon
+    as it is estimated and reporting progress and throughput on stderr
+    Parameters
+    ----------
+    args:  argparse.Namespace, arguments of the score command
+    Returns
+    -------
+    int, number of rows scored
+    """
+    options = {
+        "columns": args.columns,
+        "prior_alpha": args.prior_alpha,
+        "prior_beta": args.prior_beta,
+        "n": args.n,
+        "quantiles": args.quantiles,
+        "invalid": args.invalid,
+    }
+    tasks = (
+        (chunk, None if args.seed is None else args.seed + i, options)
+        for i, chunk in enumerate(_read_chunks(args.input, args.chunksize))
+    )
+    writer = _ChunkWriter(args.output, args.columns)
+    rows = 0
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(args.jobs) if args.jobs > 1 else None
+    try:
+        results = (
+            map(_score_chunk, tasks) if pool is None else pool.imap(_score_chunk, tasks)
+        )
+        for result in results:
+            writer.write(result)
+            rows += len(result)
+            if not args.quiet:
+                elapsed = time.perf_counter() - start
+                sys.stderr.write(
+                    "\rscored %d rows in %.1fs (%.1f rows/s)"
+                    % (rows, elapsed, rows / max(elapsed, 1e-9))
+                )
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if not args.quiet:
+        sys.stderr.write("\n")
+    return rows
+
+
+def main(argv=None):
+    """Console script for bayespropestimation."""
+    parser = _make_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 1
+    if args.chunksize <= 0 or args.jobs <= 0:
+        parser.error("--chunksize and --jobs must be positive integers")
+    try:
+        score(args)
+    except (ValueError, KeyError, ImportError, OSError) as e:
+        parser.exit(1, "bayesprop: error: " + str(e) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())  # pragma: no cover
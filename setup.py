@@ -12,26 +12,33 @@ with open("HISTORY.rst") as history_file:
 
 requirements = [
     "numpy>=1.17.2",
-    "scipy>=1.3.1",
+    "scipy>=1.4.0",
     "pandas>=0.25.1",
     "plotly>=4.9.0",
     "arviz>=0.9.0",
+    "xarray>=0.16.1",
 ]
 
 setup_requirements = [
     "pytest-runner",
-    "scipy>=1.3.1",
+    "scipy>=1.4.0",
     "pandas>=0.25.1",
     "plotly>=4.9.0",
     "arviz>=0.9.0",
+    "xarray>=0.16.1",
 ]
 
+extras_requirements = {
+    "parquet": ["pyarrow>=1.0.0"],
+}
+
 test_requirements = [
     "pytest>=3",
-    "scipy>=1.3.1",
+    "scipy>=1.4.0",
     "pandas>=0.25.1",
     "plotly>=4.9.0",
     "arviz>=0.9.0",
+    "xarray>=0.16.1",
 ]
 
 long_description = """
@@ -52,17 +59,23 @@ Simple class and methods for the Bayesian estimation and comparison of proportio
 setup(
     author="Oliver Chipperfield",
     author_email="omc0dev@googlemail.com",
-    python_requires=">=3.5",
+    python_requires=">=3.8",
     classifiers=[
         "Development Status :: 2 - Pre-Alpha",
         "Intended Audience :: Developers",
         "License :: OSI Approved :: MIT License",
         "Natural Language :: English",
-        "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
     ],
+    entry_points={
+        "console_scripts": [
+            "bayesprop=bayespropestimation.cli:main",
+        ],
+    },
     description="Class method for the Bayesian estimation and comparison of proportions",
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     long_description=long_description,  # readme + '\n\n' + history,
     include_package_data=True,
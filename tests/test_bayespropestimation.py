@@ -1,10 +1,36 @@
 #!/usr/bin/env python
+import asyncio
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import pandas as pd
 import pytest
+import scipy.integrate
+import scipy.stats
 
-from bayespropestimation.bayespropestimation import BayesProportionsEstimation
-from bayespropestimation.bayesprophelpers import _calculate_kde, _calculate_map
+from bayespropestimation.bayespropbatch import (
+    BayesProportionsBatchEstimation,
+    validate_counts,
+)
+from bayespropestimation.bayespropestimation import (
+    BayesProportionsEstimation,
+    estimate_async,
+)
+from bayespropestimation.bayesprophelpers import (
+    _beta_difference_cdf,
+    _beta_difference_sf,
+    _binned_kde,
+    _calculate_kde,
+    _calculate_map,
+    _calculate_metric,
+    _kde_bandwidth,
+    _probability_mcse,
+    _quantile_mcse,
+)
+from bayespropestimation.bayesprophierarchical import (
+    BayesHierarchicalProportionsEstimation,
+)
 from bayespropestimation.bayespropplotters import (
     _get_centre_lines,
     _get_intervals,
@@ -14,6 +40,9 @@ from bayespropestimation.bayespropplotters import (
     _make_histogram_go,
     _make_line_go,
 )
+from bayespropestimation.bayesproppower import BayesProportionsPowerAnalysis
+from bayespropestimation.bayespropsummary import PosteriorSummary
+from bayespropestimation.cli import main
 
 
 def compare_dictionaries(p, z):
@@ -24,6 +53,24 @@ def compare_dictionaries(p, z):
     return np.any(r)
 
 
+def beta_difference_pdf(d, alpha_a, beta_a, alpha_b, beta_b):
+    # Density of theta_b - theta_a at d for independent Beta variables, by 1-D quadrature of
+    # f_a(x) * f_b(x + d), split at the means of both terms so peaked posteriors are not missed
+    lower, upper = max(0, -d), min(1, 1 - d)
+    breaks = [alpha_a / (alpha_a + beta_a), alpha_b / (alpha_b + beta_b) - d]
+    breaks = np.unique(np.clip([lower] + breaks + [upper], lower, upper))
+    return sum(
+        scipy.integrate.quad(
+            lambda x: scipy.stats.beta.pdf(x, alpha_a, beta_a)
+            * scipy.stats.beta.pdf(x + d, alpha_b, beta_b),
+            breaks[i],
+            breaks[i + 1],
+            limit=200,
+        )[0]
+        for i in range(0, len(breaks) - 1)
+    )
+
+
 # Define Initialisation fixtures
 
 
@@ -136,6 +183,25 @@ def make_hdi_summary_results():
     )
 
 
+@pytest.fixture
+def make_a_batch():
+    return np.array([[10, 50], [5, 20], [0, 0]])
+
+
+@pytest.fixture
+def make_b_batch():
+    return np.array([[20, 50], [5, 20], [3, 10]])
+
+
+@pytest.fixture
+def make_segments():
+    np.random.seed(1000)
+    trials = np.random.randint(5, 200, 500)
+    a = np.column_stack([np.random.binomial(trials, 0.1), trials])
+    b = np.column_stack([np.random.binomial(trials, 0.1), trials])
+    return a, b
+
+
 # Define fixtures for delta inference testing
 
 
@@ -184,6 +250,35 @@ def test__calculate_map_results(make_draw, _calculate_map_results):
     assert np.isclose(_calculate_map_results, _calculate_map(make_draw, num=3))
 
 
+def test__calculate_kde_matches_scipy_gaussian_kde():
+    np.random.seed(1000)
+    draws = np.random.beta(2, 5, 20000)
+    x, kde_density = _calculate_kde(draws, num=1000)
+    assert np.allclose(kde_density, scipy.stats.gaussian_kde(draws)(x))
+
+
+def test__binned_kde_matches_scipy_gaussian_kde():
+    np.random.seed(1000)
+    draws = np.random.beta(2, 5, 20000)
+    x = np.linspace(np.min(draws), np.max(draws), num=1000)
+    expected = scipy.stats.gaussian_kde(draws)(x)
+    test = _binned_kde(draws, x, _kde_bandwidth(draws))
+    assert np.max(np.abs(test - expected)) < 1e-4 * np.max(expected)
+
+
+def test__probability_mcse_returns_correct_values():
+    assert np.isclose(_probability_mcse(0.5, 100), 0.05)
+    assert _probability_mcse(1, 100) == 0
+
+
+def test__quantile_mcse_shrinks_with_more_draws():
+    np.random.seed(1000)
+    small = _quantile_mcse(np.random.beta(2, 5, 1000), [0.025, 0.5, 0.975])
+    large = _quantile_mcse(np.random.beta(2, 5, 100000), [0.025, 0.5, 0.975])
+    assert np.all(small > 0)
+    assert np.all(large < small)
+
+
 # Run initialisation tests
 
 
@@ -245,6 +340,43 @@ def test_BayesProportionsEstimation_with_mmake_explicit_seed_initialises(
         raise pytest.fail()
 
 
+def test_BayesProportionsEstimation_with_mcse_target_reaches_target(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    test = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed, mcse_target=0.001
+    )
+    assert test.mcse <= 0.001
+    assert test.n > 10000
+    assert len(test.d_draw) == test.n
+
+
+def test_BayesProportionsEstimation_with_mcse_target_stops_at_max_n(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    test = BayesProportionsEstimation(
+        a=make_a_list,
+        b=make_b_list,
+        seed=make_explicit_seed,
+        mcse_target=1e-6,
+        max_n=25000,
+    )
+    assert test.n == 25000
+    assert test.mcse > 1e-6
+
+
+def test_BayesProportionsEstimation_with_mcse_target_keeps_first_batch(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    fixed = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    )
+    adaptive = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed, mcse_target=0.001
+    )
+    assert np.array_equal(fixed.a_draw, adaptive.a_draw[:10000])
+
+
 # Run ValueError tests
 
 
@@ -296,6 +428,14 @@ def test_BayesProportionsEstimation_with_make_invalid_seed_returns_ValueError(
     assert str(e.value) == "seed must be a positive integer or None"
 
 
+def test_BayesProportionsEstimation_with_invalid_mcse_target_returns_ValueError(
+    make_a_list, make_b_list
+):
+    with pytest.raises(ValueError) as e:
+        BayesProportionsEstimation(a=make_a_list, b=make_b_list, mcse_target=-1)
+    assert str(e.value) == "mcse_target must be a float > 0 or None"
+
+
 # Run results tests
 
 
@@ -339,6 +479,102 @@ def test_BayesProportionsEstimation_get_posteriors_returns_correct_results(
     assert np.allclose(test, make_get_posterior_results)
 
 
+def test_BayesProportionsEstimation_quantile_summary_as_frame_false_matches_frame(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    )
+    test = est.quantile_summary(as_frame=False)
+    assert isinstance(test, PosteriorSummary)
+    assert test.columns == ["0.025", "0.5", "0.975", "mean"]
+    assert test["parameter"] == ["theta_a", "theta_b", "delta"]
+    assert np.array_equal(test["0.5"], est.quantile_summary()["0.5"].to_numpy())
+    assert test.to_frame().equals(est.quantile_summary())
+
+
+def test_BayesProportionsEstimation_hdi_summary_as_frame_false_matches_frame(
+    make_a_list, make_b_list, make_explicit_seed, make_hdi_summary_results
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    )
+    test = est.hdi_summary(mean=False, as_frame=False)
+    assert test.columns == ["0.025", "MAP", "0.975"]
+    assert np.allclose(test.values, make_hdi_summary_results)
+    assert test.to_frame().equals(est.hdi_summary(mean=False))
+
+
+def test_predictive_summary_returns_rows_for_each_horizon(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    test = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    ).predictive_summary([10, 100, 1000])
+    assert list(test["m"]) == [10, 10, 10, 100, 100, 100, 1000, 1000, 1000]
+    assert list(test["parameter"][0:3]) == ["theta_a", "theta_b", "delta"]
+    assert np.allclose(test["mean"][0:2], [10 * 10.5 / 51, 10 * 20.5 / 51])
+
+
+def test_predictive_summary_analytic_agrees_with_simulation(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, n=100000, seed=make_explicit_seed
+    )
+    analytic = est.predictive_summary(500, as_frame=False)
+    simulated = est.predictive_summary(500, max_analytic=0, as_frame=False)
+    assert np.allclose(analytic.values, simulated.values, atol=5)
+
+
+def test_predictive_summary_with_invalid_m_returns_ValueError(make_a_list, make_b_list):
+    with pytest.raises(ValueError) as e:
+        BayesProportionsEstimation(a=make_a_list, b=make_b_list).predictive_summary(
+            [10, -1]
+        )
+    assert str(e.value) == "m must be a non-negative integer or list of integers"
+
+
+def test_BayesProportionsEstimation_quantile_summary_with_mcse_returns_errors(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    )
+    test = est.quantile_summary(mcse=True, as_frame=False)
+    assert test.columns[4:] == ["0.025_mcse", "0.5_mcse", "0.975_mcse", "mean_mcse"]
+    assert np.array_equal(
+        test.values[:, 0:4], est.quantile_summary(as_frame=False).values
+    )
+    assert np.allclose(test["mean_mcse"][0], np.std(est.a_draw, ddof=1) / 100)
+    assert np.all((test.values[:, 4:] > 0) & (test.values[:, 4:] < 0.01))
+
+
+def test_BayesProportionsEstimation_hdi_summary_with_mcse_returns_errors(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    test = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, n=2000, seed=make_explicit_seed
+    ).hdi_summary(mcse=True, as_frame=False)
+    assert test.columns[4:] == ["0.025_mcse", "MAP_mcse", "0.975_mcse", "mean_mcse"]
+    assert np.all(np.isnan(test["MAP_mcse"]))
+    assert np.all(test["0.025_mcse"] > 0)
+
+
+def test_quantile_mcse_is_consistent_with_repeated_sampling(make_a_list, make_b_list):
+    # The reported error should be close to the spread of the quantile over repeated runs
+    medians = [
+        BayesProportionsEstimation(
+            a=make_a_list, b=make_b_list, n=2000, seed=i
+        ).quantile_summary(as_frame=False)["0.5"][2]
+        for i in range(0, 200)
+    ]
+    se = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, n=2000, seed=1
+    ).quantile_summary(mcse=True, as_frame=False)["0.5_mcse"][2]
+    assert 0.7 < se / np.std(medians) < 1.4
+
+
 # Run delta inference tests
 
 
@@ -352,6 +588,28 @@ def test_infer_delta_probability_returns_correct_values(
     assert i == make_infer_delta_probability_result[1]
 
 
+def test_infer_delta_probability_with_mcse_returns_binomial_error(
+    make_a_list, make_b_list, make_explicit_seed, make_infer_delta_probability_result
+):
+    p, i, se = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    ).infer_delta_probability(print_inference=False, mcse=True)
+    assert np.isclose(p, make_infer_delta_probability_result[0])
+    assert np.isclose(se, np.sqrt(p * (1 - p) / 10000))
+
+
+def test_BayesProportionsBatchEstimation_with_mcse_returns_errors(
+    make_a_batch, make_b_batch, make_explicit_seed
+):
+    est = BayesProportionsBatchEstimation(
+        make_a_batch, make_b_batch, n=1000, seed=make_explicit_seed
+    )
+    test = est.quantile_summary(mcse=True, as_frame=False)
+    assert np.allclose(test["0.5_mcse"][0], _quantile_mcse(est.a_draw[0], [0.5]))
+    p, se = est.infer_delta_probability(mcse=True)
+    assert np.allclose(se, np.sqrt(p * (1 - p) / 1000))
+
+
 def test_infer_delta_bayes_factor_returns_correct_values(
     make_a_list, make_b_list, make_explicit_seed, make_infer_delta_bayes_factor_result
 ):
@@ -362,6 +620,872 @@ def test_infer_delta_bayes_factor_returns_correct_values(
     assert i == make_infer_delta_bayes_factor_result[1]
 
 
+# Run batch and hierarchical tests
+
+
+def test_BayesProportionsBatchEstimation_quantile_summary_matches_beta_quantiles(
+    make_a_batch, make_b_batch, make_explicit_seed
+):
+    test = BayesProportionsBatchEstimation(
+        make_a_batch, make_b_batch, n=100000, seed=make_explicit_seed
+    ).quantile_summary(as_frame=False)
+    assert list(test["experiment"]) == [0, 0, 0, 1, 1, 1, 2, 2, 2]
+    assert np.allclose(
+        test.values[0, 0:3],
+        scipy.stats.beta.ppf([0.025, 0.5, 0.975], 10.5, 40.5),
+        atol=0.002,
+    )
+
+
+def test_BayesProportionsBatchEstimation_infer_delta_probability_returns_one_per_experiment(
+    make_a_batch, make_b_batch, make_explicit_seed
+):
+    p = BayesProportionsBatchEstimation(
+        make_a_batch, make_b_batch, seed=make_explicit_seed
+    ).infer_delta_probability()
+    assert p.shape == (3,)
+    assert np.isclose(p[0], 0.9863, atol=0.005)
+    assert np.isclose(p[1], 0.5, atol=0.02)
+
+
+def test_BayesProportionsBatchEstimation_with_a_bad_proportion_returns_ValueError(
+    make_a_batch, make_b_batch
+):
+    make_a_batch[1, 0] = 30
+    with pytest.raises(ValueError) as e:
+        BayesProportionsBatchEstimation(make_a_batch, make_b_batch)
+    assert (
+        str(e.value)
+        == "the count of successes for a and/or b exceeds the number of trials"
+    )
+
+
+def test_validate_counts_returns_correct_values(make_a_batch, make_b_batch):
+    a = make_a_batch.astype(float)
+    a[0, 0] = np.nan
+    a[1, 0] = 30
+    make_b_batch[2, 0] = -1
+    test = validate_counts(a, make_b_batch, as_frame=False)
+    assert test.columns == [
+        "missing",
+        "negative",
+        "successes_exceed_trials",
+        "invalid",
+    ]
+    assert np.array_equal(
+        test.values,
+        [
+            [True, False, False, True],
+            [False, False, True, True],
+            [False, True, False, True],
+        ],
+    )
+
+
+def test_BayesProportionsBatchEstimation_with_invalid_skip_drops_rows(
+    make_a_batch, make_b_batch, make_explicit_seed
+):
+    expected = BayesProportionsBatchEstimation(
+        make_a_batch[[0, 2]], make_b_batch[[0, 2]], seed=make_explicit_seed
+    )
+    make_a_batch[1, 0] = 30
+    test = BayesProportionsBatchEstimation(
+        make_a_batch, make_b_batch, seed=make_explicit_seed, invalid="skip"
+    )
+    assert list(test.invalid_rows) == [False, True, False]
+    assert list(test.labels) == [0, 2]
+    assert np.array_equal(
+        test.quantile_summary(as_frame=False).values,
+        expected.quantile_summary(as_frame=False).values,
+    )
+
+
+def test_BayesProportionsBatchEstimation_with_invalid_flag_returns_nan_rows(
+    make_a_batch, make_b_batch, make_explicit_seed
+):
+    make_a_batch[1, 0] = -1
+    test = BayesProportionsBatchEstimation(
+        make_a_batch, make_b_batch, seed=make_explicit_seed, invalid="flag"
+    )
+    p = test.infer_delta_probability()
+    assert np.isnan(p[1]) and not np.isnan(p[[0, 2]]).any()
+    assert np.isnan(test.quantile_summary(as_frame=False).values[3:6]).all()
+    assert list(test.rope_summary(0.01)["decision"])[1] == "invalid"
+
+
+def test_BayesProportionsBatchEstimation_with_invalid_seed_returns_ValueError(
+    make_a_batch, make_b_batch, make_invalid_seed
+):
+    with pytest.raises(ValueError) as e:
+        BayesProportionsBatchEstimation(
+            make_a_batch, make_b_batch, seed=make_invalid_seed
+        )
+    assert str(e.value) == "seed must be a positive integer or None"
+
+
+def test_BayesHierarchicalProportionsEstimation_learns_prior(
+    make_segments, make_explicit_seed
+):
+    test = BayesHierarchicalProportionsEstimation(
+        *make_segments, n=1000, seed=make_explicit_seed
+    )
+    assert np.allclose(
+        test.prior_alpha / (test.prior_alpha + test.prior_beta), 0.1, atol=0.01
+    )
+    assert np.all(test.prior_alpha + test.prior_beta > 100)
+
+
+def test_BayesHierarchicalProportionsEstimation_preserves_delta(make_explicit_seed):
+    # A consistent lift of 0.02 across segments is not shrunk towards 0
+    random_state = np.random.RandomState(make_explicit_seed)
+    trials = np.full(200, 1000)
+    a = np.column_stack(
+        [random_state.binomial(trials, random_state.beta(100, 900, 200)), trials]
+    )
+    b = np.column_stack(
+        [random_state.binomial(trials, random_state.beta(120, 880, 200)), trials]
+    )
+    test = BayesHierarchicalProportionsEstimation(a, b, n=1000, seed=make_explicit_seed)
+    expected = BayesProportionsBatchEstimation(a, b, n=1000, seed=make_explicit_seed)
+    assert np.isclose(test.d_draw.mean(), expected.d_draw.mean(), rtol=0.05)
+    assert np.all(test.prior_converged)
+
+
+def test_BayesHierarchicalProportionsEstimation_with_homogeneous_segments_warns():
+    a = np.array([[10, 100]] * 3)
+    b = np.array([[12, 100]] * 3)
+    with pytest.warns(RuntimeWarning, match="completely pooled"):
+        test = BayesHierarchicalProportionsEstimation(a, b, n=100)
+    assert not np.all(test.prior_converged)
+
+
+def test_BayesHierarchicalProportionsEstimation_shrinks_small_segments(
+    make_explicit_seed,
+):
+    a = np.array([[1, 5]] + [[10, 100]] * 50)
+    b = np.array([[4, 5]] + [[10, 100]] * 50)
+    test = BayesHierarchicalProportionsEstimation(
+        a, b, n=1000, seed=make_explicit_seed
+    ).quantile_summary(as_frame=False)
+    assert 0.1 < test["mean"][1] < 0.8
+    assert (
+        test["mean"][1]
+        < BayesProportionsBatchEstimation(
+            a, b, n=1000, seed=make_explicit_seed
+        ).quantile_summary(as_frame=False)["mean"][1]
+    )
+
+
+# Run derived metric tests
+
+
+def test__calculate_metric_returns_correct_values(make_draw):
+    a, b = make_draw[:50], make_draw[50:]
+    assert np.allclose(_calculate_metric(a, b, "difference"), b - a)
+    assert np.allclose(_calculate_metric(a, b, "relative lift"), b / a - 1)
+    assert np.allclose(
+        _calculate_metric(a, b, "log odds ratio"),
+        np.log(b / (1 - b)) - np.log(a / (1 - a)),
+    )
+    out = np.empty(50)
+    assert _calculate_metric(a, b, "relative lift", out=out) is out
+
+
+def test_BayesProportionsEstimation_with_metrics_summarises_each_metric(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list,
+        b=make_b_list,
+        seed=make_explicit_seed,
+        metrics=["relative lift", "log odds ratio"],
+    )
+    test = est.quantile_summary(metric="relative lift", as_frame=False)
+    assert test["parameter"] == ["theta_a", "theta_b", "lift"]
+    assert np.isclose(test["mean"][2], np.mean(est.b_draw / est.a_draw - 1))
+    assert np.array_equal(
+        est.quantile_summary(as_frame=False).values,
+        BayesProportionsEstimation(
+            a=make_a_list, b=make_b_list, seed=make_explicit_seed
+        )
+        .quantile_summary(as_frame=False)
+        .values,
+    )
+    p, i = est.infer_delta_probability(metric="log odds ratio", print_inference=False)
+    assert np.isclose(p, 0.9863)
+
+
+def test_BayesProportionsEstimation_with_metric_not_set_returns_ValueError(
+    make_a_list, make_b_list
+):
+    with pytest.raises(ValueError) as e:
+        BayesProportionsEstimation(a=make_a_list, b=make_b_list).hdi_summary(
+            metric="relative lift"
+        )
+    assert (
+        str(e.value)
+        == "metric must be one of the metrics set at initialisation ['difference']"
+    )
+
+
+def test_infer_delta_probability_uses_value(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    )
+    p, i = est.infer_delta_probability(value=0.1, print_inference=False)
+    assert np.isclose(p, np.mean(est.d_draw > 0.1))
+
+
+def test_BayesProportionsBatchEstimation_with_metrics_summarises_each_metric(
+    make_a_batch, make_b_batch, make_explicit_seed
+):
+    est = BayesProportionsBatchEstimation(
+        make_a_batch,
+        make_b_batch,
+        n=1000,
+        seed=make_explicit_seed,
+        metrics=["relative lift"],
+    )
+    test = est.quantile_summary(metric="relative lift", as_frame=False)
+    assert np.allclose(test["mean"][2::3], np.mean(est.b_draw / est.a_draw - 1, axis=1))
+    assert est.infer_delta_probability(metric="relative lift").shape == (3,)
+
+
+# Run ROPE tests
+
+
+def test_rope_summary_returns_correct_values(
+    make_a_list, make_b_list, make_explicit_seed, make_hdi_summary_results
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    )
+    test = est.rope_summary([0, 0.05, 0.5], as_frame=False)
+    d = est.d_draw
+    assert np.allclose(test["left"], [np.mean(d < -w) for w in [0, 0.05, 0.5]])
+    assert np.allclose(test["right"], [np.mean(d > w) for w in [0, 0.05, 0.5]])
+    assert np.allclose(test.values[0, 4:6], make_hdi_summary_results[2][[0, 2]])
+    assert list(test["decision"]) == ["reject null", "undecided", "accept null"]
+
+
+def test_BayesProportionsBatchEstimation_rope_summary_matches_each_experiment(
+    make_a_batch, make_b_batch, make_explicit_seed
+):
+    est = BayesProportionsBatchEstimation(
+        make_a_batch, make_b_batch, n=1000, seed=make_explicit_seed
+    )
+    test = est.rope_summary([0.01, 0.1], value=0.05, as_frame=False)
+    assert list(test["experiment"]) == [0, 0, 1, 1, 2, 2]
+    for i in range(0, 3):
+        d = est.d_draw[i]
+        assert np.allclose(
+            test["inside"][2 * i : 2 * i + 2],
+            [np.mean((d >= 0.05 - w) & (d <= 0.05 + w)) for w in [0.01, 0.1]],
+        )
+
+
+def test_BayesProportionsBatchEstimation_rope_summary_with_extreme_row_is_exact(
+    make_explicit_seed,
+):
+    # A relative lift with a = [0, 1e9] has draws spanning many orders of magnitude
+    a = np.array([[0, 10**9]] + [[10, 50]] * 500)
+    b = np.array([[5, 10**9]] + [[12, 50]] * 500)
+    widths = [0.001, 0.01, 0.05]
+    est = BayesProportionsBatchEstimation(
+        a, b, n=1000, seed=make_explicit_seed, metrics=["relative lift"]
+    )
+    test = est.rope_summary(widths, as_frame=False, metric="relative lift")
+    d = est.metric_draws["relative lift"]
+    expected = np.array([[np.mean(np.abs(i) <= w) for w in widths] for i in d])
+    assert np.allclose(test["inside"], expected.ravel())
+
+
+def test_rope_summary_with_invalid_widths_returns_ValueError(make_a_list, make_b_list):
+    with pytest.raises(ValueError) as e:
+        BayesProportionsEstimation(a=make_a_list, b=make_b_list).rope_summary(-0.1)
+    assert str(e.value) == "widths must be a float or list of floats >= 0"
+
+
+# Run null hypothesis bayes factor tests
+
+
+def test__beta_difference_cdf_agrees_with_uniform_difference():
+    # The difference of two uniform variables has a triangular density
+    assert np.isclose(beta_difference_pdf(0.3, 1, 1, 1, 1), 0.7)
+    assert np.isclose(_beta_difference_cdf(0, 1, 1, 1, 1), 0.5)
+    assert np.isclose(_beta_difference_cdf(0.5, 1, 1, 1, 1), 1 - 0.5 * 0.5**2)
+
+
+def test_infer_delta_null_bayes_factor_point_null_matches_savage_dickey(
+    make_a_list, make_b_list
+):
+    # With a uniform prior the closed form and Savage-Dickey Bayes factors coincide
+    bf, i = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, prior_alpha=1, prior_beta=1, n=10
+    ).infer_delta_null_bayes_factor(print_inference=False)
+    assert np.isclose(
+        bf,
+        beta_difference_pdf(0, 1, 1, 1, 1) / beta_difference_pdf(0, 11, 41, 21, 31),
+    )
+    assert i == "barely worth mentioning"
+
+
+def test_infer_delta_null_bayes_factor_is_finite_and_independent_of_n(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    small = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, n=10, seed=make_explicit_seed
+    ).infer_delta_null_bayes_factor(value=0.05, print_inference=False)
+    large = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    ).infer_delta_null_bayes_factor(value=0.05, print_inference=False)
+    assert np.isfinite(small[0])
+    assert small == large
+
+
+def test_infer_delta_null_bayes_factor_is_continuous_at_zero_with_default_prior(
+    make_a_list, make_b_list
+):
+    est = BayesProportionsEstimation(a=make_a_list, b=make_b_list, n=10)
+    expected = est.infer_delta_null_bayes_factor(print_inference=False)[0]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for value in [1e-9, -1e-9, 1e-6, -1e-6]:
+            bf, i = est.infer_delta_null_bayes_factor(
+                value=value, print_inference=False
+            )
+            assert np.isclose(bf, expected, rtol=1e-3)
+            assert i == "barely worth mentioning"
+
+
+def test_infer_delta_null_bayes_factor_without_data_is_one():
+    # With no data both hypotheses predict the data equally well, for any value and the Jeffreys
+    # prior whose density is singular at 0 and 1
+    est = BayesProportionsEstimation(a=[0, 0], b=[0, 0], n=10)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for metric in ["difference", "relative lift", "log odds ratio"]:
+            for value in [0.1, -0.3, 0.5]:
+                bf = est.infer_delta_null_bayes_factor(
+                    value=value, print_inference=False, metric=metric
+                )[0]
+                # Equal to 1 up to rounding, either side of the boundary of 'negative'
+                assert np.isclose(bf, 1, rtol=1e-9)
+
+
+def test_infer_delta_null_bayes_factor_with_metric_returns_correct_values(
+    make_a_list, make_b_list
+):
+    est = BayesProportionsEstimation(a=make_a_list, b=make_b_list, n=10)
+    expected = est.infer_delta_null_bayes_factor(print_inference=False)[0]
+    for metric in ["relative lift", "log odds ratio"]:
+        # Every metric is 0 when theta_a = theta_b
+        bf, i = est.infer_delta_null_bayes_factor(
+            value=1e-9, print_inference=False, metric=metric
+        )
+        assert np.isclose(bf, expected, rtol=1e-3)
+    # A relative lift of 0.5 is close to the observed lift of 1, a difference of 0.5 is not
+    assert (
+        est.infer_delta_null_bayes_factor(
+            value=0.5, print_inference=False, metric="relative lift"
+        )[0]
+        < 1
+        < est.infer_delta_null_bayes_factor(value=0.5, print_inference=False)[0]
+    )
+
+
+def test_infer_delta_null_bayes_factor_with_extreme_log_odds_ratio_is_decisive(
+    make_a_list, make_b_list
+):
+    # The likelihood of H0 underflows to 0 for every theta_a, so the Bayes factor is infinite
+    est = BayesProportionsEstimation(a=make_a_list, b=make_b_list, n=10)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for value in [40, -40]:
+            bf, i = est.infer_delta_null_bayes_factor(
+                value=value, print_inference=False, metric="log odds ratio"
+            )
+            assert bf == np.inf
+            assert i == "decisive"
+
+
+def test__beta_difference_cdf_with_metric_matches_draws():
+    random_state = np.random.RandomState(1)
+    a = random_state.beta(10.5, 40.5, 10**6)
+    b = random_state.beta(20.5, 30.5, 10**6)
+    for metric in ["relative lift", "log odds ratio"]:
+        assert np.isclose(
+            _beta_difference_cdf(0.5, 10.5, 40.5, 20.5, 30.5, metric),
+            np.mean(_calculate_metric(a, b, metric) <= 0.5),
+            atol=0.002,
+        )
+
+
+def test_infer_delta_null_bayes_factor_with_invalid_lift_returns_ValueError(
+    make_a_list, make_b_list
+):
+    with pytest.raises(ValueError) as e:
+        BayesProportionsEstimation(
+            a=make_a_list, b=make_b_list
+        ).infer_delta_null_bayes_factor(value=-1, metric="relative lift")
+    assert str(e.value) == "value must be a float > -1 for the relative lift"
+
+
+def test_infer_delta_null_bayes_factor_with_rope_returns_correct_values():
+    bf, i = BayesProportionsEstimation(
+        a=[10000, 100000], b=[10000, 100000], n=10
+    ).infer_delta_null_bayes_factor(rope=0.01, print_inference=False)
+    assert bf < 1e-10
+    assert i == "negative"
+
+
+def test_infer_delta_null_bayes_factor_with_invalid_rope_returns_ValueError(
+    make_a_list, make_b_list
+):
+    with pytest.raises(ValueError) as e:
+        BayesProportionsEstimation(
+            a=make_a_list, b=make_b_list
+        ).infer_delta_null_bayes_factor(rope=-0.1)
+    assert str(e.value) == "rope must be a float > 0 or None"
+
+
+# Run thread safety tests
+
+
+def test_BayesProportionsEstimation_does_not_change_global_random_state(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    np.random.seed(1)
+    expected = np.random.random(3)
+    np.random.seed(1)
+    BayesProportionsEstimation(a=make_a_list, b=make_b_list, seed=make_explicit_seed)
+    assert np.array_equal(np.random.random(3), expected)
+
+
+def test_BayesProportionsEstimation_draws_are_read_only(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    a_draw, b_draw, d_draw = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    ).get_posteriors()
+    with pytest.raises(ValueError):
+        d_draw[0] = 0
+
+
+def test_BayesProportionsEstimation_threads_match_serial_execution(
+    make_a_list, make_b_list
+):
+    def run(seed):
+        est = BayesProportionsEstimation(
+            a=make_a_list, b=make_b_list, n=2000, seed=seed
+        )
+        return (
+            est.quantile_summary(as_frame=False).values,
+            est.infer_delta_probability(print_inference=False)[0],
+            est.predictive_summary(10**6, max_analytic=0, as_frame=False).values,
+        )
+
+    seeds = list(range(0, 16))
+    serial = [run(i) for i in seeds]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        threaded = list(executor.map(run, seeds))
+    for s, t in zip(serial, threaded):
+        for i, j in zip(s, t):
+            assert np.array_equal(i, j)
+
+
+def test_shared_BayesProportionsEstimation_threads_match_serial_execution(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, n=2000, seed=make_explicit_seed
+    )
+    expected = est.hdi_summary(as_frame=False).values
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        threaded = list(
+            executor.map(lambda i: est.hdi_summary(as_frame=False).values, range(8))
+        )
+    for t in threaded:
+        assert np.array_equal(t, expected)
+
+
+# Run shared memory tests
+
+
+def _attached_quantile_summary(handle):
+    est = handle.attach()
+    values = est.quantile_summary(as_frame=False, metric="relative lift").values
+    del est
+    handle.close()
+    return values
+
+
+def test_share_draws_attach_returns_same_draws_without_copy(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    )
+    with est.share_draws() as handle:
+        attached = handle.attach()
+        for i, j in zip(attached.get_posteriors(), est.get_posteriors()):
+            assert np.array_equal(i, j)
+            assert not i.flags.owndata and not i.flags.writeable
+        assert attached.seed == est.seed and attached.prior_alpha == est.prior_alpha
+        del attached, i, j
+
+
+def test_share_draws_handle_pickles_without_draws(
+    make_a_batch, make_b_batch, make_explicit_seed
+):
+    import pickle
+
+    est = BayesProportionsBatchEstimation(
+        make_a_batch, make_b_batch, seed=make_explicit_seed
+    )
+    with est.share_draws() as handle:
+        assert len(pickle.dumps(handle)) < est.a_draw.nbytes / 10
+
+
+def test_share_draws_process_pool_returns_correct_values(
+    make_a_batch, make_b_batch, make_explicit_seed
+):
+    import multiprocessing
+
+    est = BayesProportionsBatchEstimation(
+        make_a_batch,
+        make_b_batch,
+        seed=make_explicit_seed,
+        metrics=["relative lift"],
+    )
+    expected = est.quantile_summary(as_frame=False, metric="relative lift").values
+    with est.share_draws() as handle:
+        with multiprocessing.Pool(2) as pool:
+            results = pool.map(_attached_quantile_summary, [handle] * 2)
+    for r in results:
+        assert np.array_equal(r, expected)
+
+
+def test_share_draws_memmap_returns_correct_values(
+    make_a_list, make_b_list, make_explicit_seed, tmp_path
+):
+    path = str(tmp_path / "draws.dat")
+    est = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    )
+    with est.share_draws(path) as handle:
+        attached = handle.attach()
+        assert np.array_equal(
+            attached.hdi_summary(as_frame=False).values,
+            est.hdi_summary(as_frame=False).values,
+        )
+        del attached
+    assert not (tmp_path / "draws.dat").exists()
+
+
+# Run power analysis tests
+
+
+def test__beta_difference_sf_matches_quadrature():
+    alpha_a, beta_a = np.array([10.5, 0.5, 1000.5]), np.array([40.5, 10.5, 9000.5])
+    alpha_b, beta_b = np.array([20.5, 3.5, 1100.5]), np.array([30.5, 7.5, 8900.5])
+    test = _beta_difference_sf(0.01, alpha_a, beta_a, alpha_b, beta_b)
+    for i, t in enumerate(test):
+        assert np.isclose(
+            t,
+            1
+            - _beta_difference_cdf(0.01, alpha_a[i], beta_a[i], alpha_b[i], beta_b[i]),
+            atol=1e-4,
+        )
+
+
+def test_BayesProportionsPowerAnalysis_power_matches_simulation(make_explicit_seed):
+    # Brute force: estimate every simulated dataset with BayesProportionsEstimation
+    random_state = np.random.RandomState(make_explicit_seed)
+    expected = np.mean(
+        [
+            BayesProportionsEstimation(
+                [random_state.binomial(500, 0.1), 500],
+                [random_state.binomial(500, 0.15), 500],
+                seed=i,
+            ).infer_delta_probability(print_inference=False)[0]
+            > 0.95
+            for i in range(200)
+        ]
+    )
+    test = BayesProportionsPowerAnalysis(0.1, 0.15, seed=make_explicit_seed).power(500)
+    assert np.isclose(test, expected, atol=0.1)
+
+
+def test_BayesProportionsPowerAnalysis_power_curve_returns_correct_values(
+    make_explicit_seed,
+):
+    analysis = BayesProportionsPowerAnalysis(
+        0.1, 0.15, simulations=500, seed=make_explicit_seed
+    )
+    test = analysis.power_curve([100, 400, 1600], as_frame=False)
+    assert list(test["trials"]) == [100, 400, 1600]
+    assert np.all(np.diff(test["power"]) > 0)
+    assert test["power"][0] == analysis.power(100)
+    assert test["power_mcse"][0] == np.sqrt(
+        test["power"][0] * (1 - test["power"][0]) / 500
+    )
+
+
+def test_BayesProportionsPowerAnalysis_find_sample_size_returns_first_crossing(
+    make_explicit_seed,
+):
+    analysis = BayesProportionsPowerAnalysis(
+        0.1, 0.15, simulations=500, seed=make_explicit_seed
+    )
+    test = analysis.find_sample_size(target=0.8)
+    assert analysis.power(test) >= 0.8
+    assert analysis.power(test - 1) < 0.8
+    # The search path differs with n_jobs, so may find another crossing of the target
+    test = analysis.find_sample_size(target=0.8, n_jobs=2)
+    assert analysis.power(test) >= 0.8 > analysis.power(test - 1)
+
+
+def test_BayesProportionsPowerAnalysis_with_invalid_rate_returns_ValueError():
+    with pytest.raises(ValueError) as e:
+        BayesProportionsPowerAnalysis(1.5, 0.15)
+    assert (
+        str(e.value)
+        == "rate_a and rate_b must be floats or lists of floats >= 0 and <= 1"
+    )
+
+
+# Run export tests
+
+
+def test_BayesProportionsEstimation_to_inference_data_wraps_draws_without_copy(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list,
+        b=make_b_list,
+        seed=make_explicit_seed,
+        metrics=["difference", "relative lift"],
+    )
+    test = est.to_inference_data().posterior
+    assert list(test.data_vars) == ["theta_a", "theta_b", "delta", "lift"]
+    assert dict(test.sizes) == {"chain": 1, "draw": 10000}
+    assert np.shares_memory(test["lift"].values, est.metric_draws["relative lift"])
+    assert test.attrs["a_successes"] == make_a_list[0]
+
+
+def test_BayesProportionsEstimation_to_dataset_with_names_returns_correct_values(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    est = BayesProportionsEstimation(
+        a=make_a_list, b=make_b_list, seed=make_explicit_seed
+    )
+    test = est.to_dataset(names=["control", "variant", "uplift"])
+    assert np.array_equal(test["uplift"].values[0], est.d_draw)
+    with pytest.raises(ValueError) as e:
+        est.to_dataset(names=["control", "variant"])
+    assert str(e.value) == "names must be a list of 2 + len(metrics) distinct names"
+
+
+def test_BayesProportionsBatchEstimation_to_dataset_has_experiment_dimension(
+    make_a_batch, make_b_batch, make_explicit_seed
+):
+    est = BayesProportionsBatchEstimation(
+        make_a_batch, make_b_batch, seed=make_explicit_seed, labels=["x", "y", "z"]
+    )
+    test = est.to_dataset()
+    assert test["delta"].dims == ("chain", "draw", "experiment")
+    assert np.shares_memory(test["delta"].values, est.d_draw)
+    assert np.array_equal(test["delta"].sel(experiment="y").values[0], est.d_draw[1])
+    assert list(test["a_trials"].values) == [50, 20, 0]
+
+
+# Run command line tests
+
+
+@pytest.fixture
+def make_input_csv(tmp_path):
+    path = str(tmp_path / "input.csv")
+    pd.DataFrame(
+        {
+            "id": [1, 2, 3, 4, 5],
+            "a_successes": [10, 5, 0, 30, 1],
+            "a_trials": [50, 20, 0, 100, 10],
+            "b_successes": [20, 5, 3, 25, 9],
+            "b_trials": [50, 20, 10, 100, 10],
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+def test_cli_score_writes_summaries_for_every_row(make_input_csv, tmp_path):
+    output = str(tmp_path / "output.csv")
+    assert (
+        main(
+            [
+                "score",
+                make_input_csv,
+                "-o",
+                output,
+                "--chunksize",
+                "2",
+                "--seed",
+                "1",
+                "-q",
+            ]
+        )
+        == 0
+    )
+    test = pd.read_csv(output)
+    assert list(test["id"]) == [1, 2, 3, 4, 5]
+    assert list(test.columns[5:9]) == [
+        "theta_a_0.025",
+        "theta_a_0.5",
+        "theta_a_0.975",
+        "theta_a_mean",
+    ]
+    assert np.isclose(test["prob_delta_greater_than_0"][0], 0.9863, atol=0.005)
+
+
+def test_cli_score_with_jobs_matches_single_process(make_input_csv, tmp_path):
+    single = str(tmp_path / "single.csv")
+    multi = str(tmp_path / "multi.csv")
+    args = ["--chunksize", "2", "--seed", "1", "-n", "1000", "-q"]
+    main(["score", make_input_csv, "-o", single] + args)
+    main(["score", make_input_csv, "-o", multi, "--jobs", "2"] + args)
+    assert pd.read_csv(single).equals(pd.read_csv(multi))
+
+
+def test_cli_score_with_invalid_skip_drops_rows(make_input_csv, tmp_path):
+    df = pd.read_csv(make_input_csv)
+    df.loc[1, "a_successes"] = 50
+    df.to_csv(make_input_csv, index=False)
+    output = str(tmp_path / "output.csv")
+    main(["score", make_input_csv, "-o", output, "--invalid", "skip", "-q"])
+    assert list(pd.read_csv(output)["id"]) == [1, 3, 4, 5]
+    main(["score", make_input_csv, "-o", output, "--invalid", "flag", "-q"])
+    assert list(pd.read_csv(output)["invalid"]) == [False, True, False, False, False]
+
+
+def test_cli_score_with_invalid_skip_scores_rows_after_an_empty_chunk(
+    make_input_csv, tmp_path
+):
+    df = pd.read_csv(make_input_csv)
+    df.loc[[2, 3], "a_successes"] = -1
+    df.to_csv(make_input_csv, index=False)
+    output = str(tmp_path / "output.csv")
+    main(
+        [
+            "score",
+            make_input_csv,
+            "-o",
+            output,
+            "--chunksize",
+            "2",
+            "--invalid",
+            "skip",
+            "-q",
+        ]
+    )
+    test = pd.read_csv(output)
+    assert list(test["id"]) == [1, 2, 5]
+    assert not test["delta_mean"].isna().any()
+
+
+def test_cli_score_reads_and_writes_parquet(make_input_csv, tmp_path):
+    pytest.importorskip("pyarrow")
+    parquet_in = str(tmp_path / "input.parquet")
+    parquet_out = str(tmp_path / "output.parquet")
+    pd.read_csv(make_input_csv).to_parquet(parquet_in)
+    main(["score", parquet_in, "-o", parquet_out, "--chunksize", "2", "-q"])
+    assert len(pd.read_parquet(parquet_out)) == 5
+
+
+def test_cli_score_writes_parquet_with_missing_count_in_later_chunk(
+    make_input_csv, tmp_path
+):
+    pytest.importorskip("pyarrow")
+    df = pd.read_csv(make_input_csv)
+    # Integers in the first chunks and a missing value in a later one
+    df["a_successes"] = df["a_successes"].astype("Int64")
+    df.loc[3, "a_successes"] = pd.NA
+    df.to_csv(make_input_csv, index=False)
+    output = str(tmp_path / "output.parquet")
+    main(
+        [
+            "score",
+            make_input_csv,
+            "-o",
+            output,
+            "--chunksize",
+            "2",
+            "--invalid",
+            "flag",
+            "-q",
+        ]
+    )
+    test = pd.read_parquet(output)
+    assert list(test["invalid"]) == [False, False, False, True, False]
+    assert test["a_successes"].isna().sum() == 1
+
+
+# Run async tests
+
+
+def test_estimate_async_returns_same_draws_as_sync(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    test = asyncio.run(
+        estimate_async(make_a_list, make_b_list, seed=make_explicit_seed)
+    )
+    expected = BayesProportionsEstimation(
+        make_a_list, make_b_list, seed=make_explicit_seed
+    )
+    assert np.array_equal(test.d_draw, expected.d_draw)
+
+
+def test_estimate_async_coalesces_identical_requests(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    async def run():
+        return await asyncio.gather(
+            estimate_async(make_a_list, make_b_list, seed=make_explicit_seed),
+            estimate_async(make_a_list, make_b_list, seed=make_explicit_seed),
+            estimate_async(make_a_list, make_b_list, seed=make_explicit_seed + 1),
+        )
+
+    first, second, third = asyncio.run(run())
+    assert first is second
+    assert first is not third
+
+
+def test_hdi_summary_async_returns_same_results_as_sync(
+    make_a_list, make_b_list, make_explicit_seed, make_hdi_summary_results
+):
+    est = BayesProportionsEstimation(make_a_list, make_b_list, seed=make_explicit_seed)
+
+    async def run():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return await asyncio.gather(
+                est.hdi_summary_async(executor=executor),
+                est.hdi_summary_async(executor=executor),
+                est.quantile_summary_async(executor=executor),
+            )
+
+    hdi, hdi_again, quantile = asyncio.run(run())
+    # Coalesced callers share the calculation but not the result
+    assert hdi is not hdi_again
+    assert hdi.equals(hdi_again)
+    hdi.iloc[0, 0] = np.nan
+    assert not np.isnan(hdi_again.iloc[0, 0])
+    assert np.allclose(
+        np.array(hdi_again)[:, 0:3].astype(float), make_hdi_summary_results
+    )
+    assert quantile.equals(est.quantile_summary())
+
+
 # RUn bayespropplotters tests
 
 
@@ -419,6 +1543,20 @@ def test__make_area_go_without_error(make_draw):
 # Run plot_posterior method test
 
 
+def test_plot_posterior_with_metric_without_error(
+    make_a_list, make_b_list, make_explicit_seed
+):
+    try:
+        BayesProportionsEstimation(
+            a=make_a_list,
+            b=make_b_list,
+            seed=make_explicit_seed,
+            metrics=["relative lift"],
+        ).posterior_plot(metric="relative lift")
+    except:
+        raise pytest.fail()
+
+
 def test_plot_posterior_with_error(make_a_list, make_b_list, make_explicit_seed):
     try:
         BayesProportionsEstimation(